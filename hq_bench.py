@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Command line utility to measure the performance of HQ Tools rom libraries using synthetic dat files.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+
+from libs import bench
+from libs import roms
+from libs import strings
+from libs import time
+
+# CONSTANTS
+#=======================================================================================================================
+u_PROG_NAME = u'HQ BENCH'
+u_PROG_VER = u'v2015.10.25'
+
+
+# HELPER FUNCTIONS
+#=======================================================================================================================
+def _get_cmd_options():
+    """
+    Function to process the command-line options.
+
+    :return: A dictionary with the options.
+    """
+
+    o_arg_parser = argparse.ArgumentParser(description='A command line utility to measure the performance of HQ Tools '
+                                                       'rom libraries using synthetic dat files.')
+    o_arg_parser.add_argument('-g',
+                              action='store',
+                              type=int,
+                              nargs='+',
+                              default=[40000],
+                              help='Number of games of the synthetic dats. Several values can be used to measure '
+                                   'different sizes. i.e. "1000 10000 200000"')
+    o_arg_parser.add_argument('-r',
+                              action='store',
+                              type=int,
+                              nargs='+',
+                              default=[1],
+                              help='Number of roms of each game of the synthetic dats. Several values can be used. '
+                                   'i.e. "1 10 50"')
+    o_arg_parser.add_argument('-l',
+                              action='store',
+                              type=int,
+                              default=10000,
+                              help='Number of lookups of each kind performed in the lookup phase. i.e. "10000"')
+    o_arg_parser.add_argument('-o',
+                              action='store',
+                              default=None,
+                              help='Output json file for the results. i.e. "/home/john/bench_2015-10-25.json"')
+    o_arg_parser.add_argument('-b',
+                              action='store',
+                              default=None,
+                              help='Json file with the results of a previous run to compare with. i.e. '
+                                   '"/home/john/bench_2015-10-18.json"')
+
+    o_args = o_arg_parser.parse_args()
+
+    return {'li_games': o_args.g,
+            'li_roms': o_args.r,
+            'i_lookups': o_args.l,
+            'u_out_file': o_args.o,
+            'u_base_file': o_args.b}
+
+
+def _result_key(pdx_result):
+    """
+    Function to get the key used to compare results of different runs.
+
+    :param pdx_result: Dictionary with the result of a benchmark.
+
+    :return: A tuple (format, number of games, number of roms).
+    """
+
+    return pdx_result['s_format'], pdx_result['i_games'], pdx_result['i_roms']
+
+
+def _result_print(pdx_result, pdx_base=None):
+    """
+    Function to print the result of a benchmark.
+
+    :param pdx_result: Dictionary with the result of a benchmark.
+
+    :param pdx_base: Dictionary with the result of the same benchmark in a previous run. If present, the relative change
+                     of each measure is printed too.
+
+    :return: Nothing.
+    """
+
+    def _change(ps_key):
+        if pdx_base is None or not pdx_base.get(ps_key):
+            u_change = u''
+        else:
+            u_change = u' (%+.0f%%)' % (100.0 * (pdx_result[ps_key] - pdx_base[ps_key]) / pdx_base[ps_key])
+        return u_change
+
+    print u'   DAT: %s %i games x %i roms, file %i KiB' % (pdx_result['s_format'], pdx_result['i_games'],
+                                                          pdx_result['i_roms'], pdx_result['i_file_kb'])
+
+    for s_phase in bench.tu_PHASES:
+        s_key = 'f_%s' % s_phase
+        print u'        %-6s %8.3fs%s' % (s_phase, pdx_result[s_key], _change(s_key))
+
+    print u'        rate   %8i lookups/s' % (pdx_result['i_lookups'] / max(pdx_result['f_lookup'], 1e-6))
+    print u'        memory %8i KiB (peak)%s' % (pdx_result['i_peak_kb'], _change('i_peak_kb'))
+    print
+
+
+# MAIN FUNCTION
+#=======================================================================================================================
+def hq_bench(pli_games=(40000,), pli_roms=(1,), pi_lookups=10000, pu_out_file=None, pu_base_file=None,
+             pb_print=False):
+    """
+    Function to generate synthetic ClrMamePro and XML dats and measure the time needed by each phase of their loading
+    and usage (see bench.phases_measure()), and the memory needed.
+
+    :param pli_games: Numbers of games of the synthetic dats. i.e. (1000, 10000, 200000)
+
+    :param pli_roms: Numbers of roms of each game. A dat is generated for each combination of games and roms.
+
+    :param pi_lookups: Number of lookups of each kind performed in the lookup phase.
+
+    :param pu_out_file: Json file to save the results. If None, they are not saved.
+
+    :param pu_base_file: Json file with the results of a previous run. If present, results are compared with them when
+                         printing.
+
+    :param pb_print: If True, the results will be printed to screen.
+
+    :return: A dictionary with information about the run and the list of results 'ldx_results'. Each result contains
+             the format, games and roms of the dat, the seconds of each phase and the memory peak in KiB (over the
+             memory used before parsing the dat). i.e. {'s_format': 'cmp', 'i_games': 1000, 'f_parse': 0.2...}
+    """
+
+    dx_run = {'s_hq_version': roms._u_VERSION,
+              's_python': platform.python_version(),
+              's_date': time.now().strftime('%Y-%m-%d %H:%M:%S'),
+              'ldx_results': []}
+
+    ddx_base = {}
+    if pu_base_file:
+        o_file = open(pu_base_file, 'rb')
+        for dx_result in json.load(o_file)['ldx_results']:
+            ddx_base[_result_key(dx_result)] = dx_result
+        o_file.close()
+
+    u_tmp_dir = tempfile.mkdtemp(prefix=u'hq_bench_')
+
+    try:
+        for i_games in pli_games:
+            for i_roms in pli_roms:
+                for s_format, px_writer in (('cmp', bench.cmp_dat_write), ('xml', bench.xml_dat_write)):
+                    u_file = os.path.join(u_tmp_dir, u'synthetic.%s' % s_format)
+                    px_writer(u_file, pi_games=i_games, pi_roms=i_roms)
+
+                    dx_profile = bench.profile_call(bench.phases_measure, u_file, s_format, pi_lookups=pi_lookups)
+
+                    dx_result = dx_profile['x_output']
+                    dx_result['s_format'] = s_format
+                    dx_result['i_roms'] = i_roms
+                    dx_result['i_file_kb'] = os.path.getsize(u_file) / 1024
+                    dx_result['i_peak_kb'] = dx_profile['i_peak_kb'] - dx_profile['i_base_kb']
+                    dx_run['ldx_results'].append(dx_result)
+
+                    os.remove(u_file)
+
+                    if pb_print:
+                        _result_print(dx_result, ddx_base.get(_result_key(dx_result)))
+                        sys.stdout.flush()
+
+    finally:
+        shutil.rmtree(u_tmp_dir)
+
+    if pu_out_file:
+        o_file = open(pu_out_file, 'wb')
+        json.dump(dx_run, o_file, indent=1, sort_keys=True)
+        o_file.close()
+
+    return dx_run
+
+
+# EXECUTION AS COMMAND LINE PROGRAM
+#=======================================================================================================================
+if __name__ == '__main__':
+    print strings.hq_title(u_PROG_NAME, u_PROG_VER)
+
+    dx_cmd_params = _get_cmd_options()
+
+    hq_bench(pli_games=dx_cmd_params['li_games'], pli_roms=dx_cmd_params['li_roms'],
+             pi_lookups=dx_cmd_params['i_lookups'], pu_out_file=dx_cmd_params['u_out_file'],
+             pu_base_file=dx_cmd_params['u_base_file'], pb_print=True)
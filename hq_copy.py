@@ -9,10 +9,12 @@ Clean mode, meta-data files not actually present in the real disc (.cue files) w
 """
 
 import argparse
+import itertools
+import json
 import os         # I use os only to remove files so maybe it's a waste of memory
 import re
-import shutil
 import sys
+from multiprocessing.pool import ThreadPool
 
 from libs import cons
 from libs import files
@@ -41,6 +43,11 @@ class Args:
         self.u_dst_format = u''
         self.u_regex_pattern = u''
         self.i_regex_group = None
+        self.u_changes_file = None
+        self.i_workers = 1
+        self.u_link_mode = u'copy'
+        self.b_move = False
+        self.b_incremental = False
 
 
 class HqCopyOut(object):
@@ -50,7 +57,14 @@ class HqCopyOut(object):
     def __init__(self):
         self.lu_renamed = []
         self.lu_unknown = []
+        self.lu_skipped = []     # Files of romsets not included in the changes passed to hq_copy()
+        self.lu_moved = []       # Files moved with a rename (in move mode, the rest of renamed files were copied)
+        self.lu_uptodate = []    # Files not copied because their destination was already up to date (incremental mode)
+        self.i_copied = 0        # Files actually copied (0 in simulation mode)
+        self.i_bytes = 0         # Bytes actually copied
+        self.di_link_modes = {}  # Copied files by the way they were actually copied. i.e. {'hard': 10, 'copy': 2}
         self.o_time = None
+        self.o_copy_time = None  # Time spent copying the files (the total time includes the search of the names)
 
     def get_num_ren_files(self):
         return len(self.lu_renamed)
@@ -58,8 +72,28 @@ class HqCopyOut(object):
     def get_num_unk_files(self):
         return len(self.lu_unknown)
 
+    def get_num_skp_files(self):
+        return len(self.lu_skipped)
+
+    def get_num_mov_files(self):
+        return len(self.lu_moved)
+
+    def get_num_upd_files(self):
+        return len(self.lu_uptodate)
+
+    def get_files_per_second(self):
+        return self.i_copied / max(self.o_copy_time.total_seconds(), 1e-6)
+
+    def get_mb_per_second(self):
+        return self.i_bytes / 1048576.0 / max(self.o_copy_time.total_seconds(), 1e-6)
+
     i_renamed = property(fget=get_num_ren_files)
     i_unknown = property(fget=get_num_unk_files)
+    i_skipped = property(fget=get_num_skp_files)
+    i_moved = property(fget=get_num_mov_files)
+    i_uptodate = property(fget=get_num_upd_files)
+    f_files_per_second = property(fget=get_files_per_second)
+    f_mb_per_second = property(fget=get_mb_per_second)
 
 
 # CONSTANTS
@@ -67,7 +101,8 @@ class HqCopyOut(object):
 du_HASH_MODE = {'': u'', 'c': u'clean ', 'd': u'dirty'}
 du_HASH = {'C': u'crc32', 'M': u'md5', 'S': u'sha1', 'T': u'description'}
 u_PROG_NAME = u'HQ COPY'
-u_PROG_VER = u'v2015.10.11'
+u_PROG_VER = u'v2015.11.22'
+u_JOURNAL_FILE = u'.hq_copy.journal'  # Journal of the copied files written in the destination dir (incremental mode)
 
 lu_VALID_MODES = []
 do_valid_single_modes = {'cC': SingleMode(pu_desc=u'clean CRC32', ps_field='u_ccrc32'),
@@ -122,6 +157,30 @@ def _get_cmd_options():
                               action='store',
                               help='Regex pattern and group. i.e. "(.*),0". Everything BEFORE the comma is the '
                                    'pattern and everything AFTER the comma is the group to capture.')
+    o_arg_parser.add_argument('-c',
+                              action='store',
+                              help='Changes file created by hq_dat_diff. Only the files of the romsets added, renamed '
+                                   'or changed will be copied. i.e. "/home/john/snes_changes.json"')
+    o_arg_parser.add_argument('-j',
+                              action='store',
+                              type=int,
+                              default=1,
+                              help='Number of files copied at the same time. Useful for network drives and SSDs. i.e. '
+                                   '"4"')
+    o_arg_parser.add_argument('-m',
+                              action='store_true',
+                              help='Move mode; source files are moved instead of copied.')
+    o_arg_parser.add_argument('-i',
+                              action='store_true',
+                              help='Incremental mode; files whose destination is already up to date are skipped, so '
+                                   'an interrupted run can be resumed and new files can be added quickly.')
+    o_arg_parser.add_argument('--link',
+                              action='store',
+                              choices=files.tu_LINK_MODES,
+                              default='copy',
+                              help='Way to create the destination files: hard links, symbolic links, copy-on-write '
+                                   'clones (reflink) or regular copies (default). When hard links or clones are not '
+                                   'possible (i.e. different devices), regular copies are done.')
 
     # Parsing and validation of the parameters
     i_errors = 0
@@ -196,6 +255,46 @@ def _get_cmd_options():
             u_text_output += u'  REXP: %s Wrong regular expression data "%s"\n' % (cons.u_ER_TEXT, u_regex_data)
             i_errors += 1
 
+    # Validating changes file
+    u_changes_file = None
+    if o_args.c:
+        u_changes_file = o_args.c.decode('utf8')
+        if files.FilePath(u_changes_file).is_file():
+            u_changes_found = cons.u_OK_TEXT
+        else:
+            u_changes_found = cons.u_ER_TEXT
+            i_errors += 1
+
+        u_text_output += u'  CHNG: %s %s\n' % (u_changes_found, u_changes_file)
+
+    # Validating number of parallel copies
+    i_workers = o_args.j
+    if i_workers != 1:
+        if i_workers > 1:
+            u_text_output += u'  JOBS: %s %i parallel copies\n' % (cons.u_OK_TEXT, i_workers)
+        else:
+            u_text_output += u'  JOBS: %s Wrong number of parallel copies "%i"\n' % (cons.u_ER_TEXT, i_workers)
+            i_errors += 1
+
+    # Link mode
+    u_link_mode = o_args.link.decode('utf8')
+    if u_link_mode != u'copy':
+        u_text_output += u'  LINK: %s %s\n' % (cons.u_OK_TEXT, u_link_mode)
+
+    # Move mode
+    b_move = o_args.m
+    if b_move:
+        if u_link_mode == u'copy':
+            u_text_output += u'  MOVE: %s source files will be moved\n' % cons.u_OK_TEXT
+        else:
+            u_text_output += u'  MOVE: %s Move mode can\'t be used with links\n' % cons.u_ER_TEXT
+            i_errors += 1
+
+    # Incremental mode
+    b_incremental = o_args.i
+    if b_incremental:
+        u_text_output += u'  INCR: %s files already up to date will be skipped\n' % cons.u_OK_TEXT
+
     if i_errors:
         u_text_output += u'\n%i errors found. Please, fix them and run the program again.' % i_errors
 
@@ -214,6 +313,11 @@ def _get_cmd_options():
     o_output_args.u_dst_format = u_dst_format
     o_output_args.u_regex_pattern = u_regex
     o_output_args.i_regex_group = i_regex_group
+    o_output_args.u_changes_file = u_changes_file
+    o_output_args.i_workers = i_workers
+    o_output_args.u_link_mode = u_link_mode
+    o_output_args.b_move = b_move
+    o_output_args.b_incremental = b_incremental
 
     return o_output_args
 
@@ -227,6 +331,180 @@ def _get_cmd_options():
     #        'i_regex_group': i_regex_group}
 
 
+def _copy_map_build(po_dat, ps_src_field, ps_dst_field):
+    """
+    Function to build the table used to translate the names of the source files to the names of the destination files.
+
+    :param po_dat: RomSetContainer (or any other iterable container of romsets).
+
+    :param ps_src_field: Romset field used to name the source files. i.e. 'u_ccrc32'
+
+    :param ps_dst_field: Romset field used to name the destination files. i.e. 'u_name'
+
+    :return: A dictionary {source name: (romset id, destination name)}. When several romsets share the same source
+             name, the first one in the container is used, like get_romsets_by_field() would do.
+    """
+
+    dtu_copy_map = {}
+
+    for o_romset in po_dat:
+        u_src_name = getattr(o_romset, ps_src_field)
+        if u_src_name not in dtu_copy_map:
+            dtu_copy_map[u_src_name] = (o_romset.u_dmd5, getattr(o_romset, ps_dst_field))
+
+    return dtu_copy_map
+
+
+def _file_copy(ptu_job):
+    """
+    Function to copy a file. It's run by the worker threads of hq_copy().
+
+    :param ptu_job: Tuple (source path, destination path, link mode, move, keep times). If the destination path is
+                    None, nothing is done. See files.file_link() for the link modes and files.file_move() for the move
+                    mode. If keep times is True, new copies get the modification time of the source (so later runs can
+                    check they are up to date).
+
+    :return: A tuple (bytes copied, link mode actually used, fingerprint). (0, None, None) when nothing is done. Bytes
+             are only counted when the data was actually copied (i.e. not for links nor renamed files).
+             In move mode, the link mode is 'move' when the file was renamed and 'copy' when it was copied (and the
+             source deleted). See _fingerprint() for the fingerprint.
+    """
+
+    u_src_path, u_dst_path, u_link_mode, b_move, b_keep_times = ptu_job
+
+    i_bytes = 0
+    s_link_mode = None
+    li_fingerprint = None
+
+    if u_dst_path is not None:
+        o_src_stat = os.stat(u_src_path)
+
+        if b_move:
+            s_link_mode = files.file_move(u_src_path, u_dst_path)
+        else:
+            s_link_mode = files.file_link(u_src_path, u_dst_path, u_link_mode)
+
+        if s_link_mode == 'copy':
+            i_bytes = o_src_stat.st_size
+
+        # Links and renamed files already share the times of the source.
+        if b_keep_times and s_link_mode in ('copy', 'reflink'):
+            os.utime(u_dst_path, (o_src_stat.st_atime, o_src_stat.st_mtime))
+
+        li_fingerprint = _fingerprint(o_src_stat, os.stat(u_dst_path))
+
+    return i_bytes, s_link_mode, li_fingerprint
+
+
+def _files_copy(pltu_jobs):
+    """
+    Function to run several copies one after another. It's used by hq_copy() to copy all the files with the same
+    destination in the same worker thread, so they are never copied at the same time and the last one always wins.
+
+    :param pltu_jobs: List of jobs. See _file_copy().
+
+    :return: A list with the result of each job. See _file_copy().
+    """
+
+    return [_file_copy(tu_job) for tu_job in pltu_jobs]
+
+
+def _fingerprint(po_src_stat, po_dst_stat):
+    """
+    Function to get the data used to know if a copied file is up to date.
+
+    :param po_src_stat: os.stat() result of the source file.
+
+    :param po_dst_stat: os.stat() result of the destination file.
+
+    :return: A list [source size, source modification time, destination size, destination modification time]. Times
+             are truncated to seconds since some filesystems don't store fractions.
+    """
+
+    return [po_src_stat.st_size, int(po_src_stat.st_mtime), po_dst_stat.st_size, int(po_dst_stat.st_mtime)]
+
+
+def _journal_load(pu_file):
+    """
+    Function to read the journal of the files copied to a destination dir. Each line of the journal is a json list
+    [destination file name, source path, fingerprint...] (see _fingerprint()). Lines are appended as soon as each
+    file is copied, so the journal of an interrupted run is valid too.
+
+    :param pu_file: Journal file. i.e. '/home/cecil/output_pics/.hq_copy.journal'
+
+    :return: A dictionary {destination file name: [source path, fingerprint...]}. It's empty if the journal doesn't
+             exist.
+    """
+
+    dlx_journal = {}
+
+    if os.path.isfile(pu_file):
+        o_file = open(pu_file, 'rb')
+        for s_line in o_file:
+            try:
+                lx_entry = json.loads(s_line)
+            except ValueError:
+                # The last line of an interrupted run can be incomplete.
+                continue
+
+            if isinstance(lx_entry, list) and len(lx_entry) == 6:
+                dlx_journal[lx_entry[0]] = lx_entry[1:]
+        o_file.close()
+
+    return dlx_journal
+
+
+def _journal_save(pu_file, pdlx_journal):
+    """
+    Function to write a journal from scratch (appended lines of previous runs are discarded). The file is replaced
+    atomically, so the old journal is kept if the process is interrupted.
+
+    :param pu_file: Journal file. i.e. '/home/cecil/output_pics/.hq_copy.journal'
+
+    :param pdlx_journal: Dictionary {destination file name: [source path, fingerprint...]}.
+
+    :return: Nothing.
+    """
+
+    u_tmp_file = u'%s.tmp' % pu_file
+
+    o_file = open(u_tmp_file, 'wb')
+    for u_dst_file, lx_data in sorted(pdlx_journal.iteritems()):
+        o_file.write('%s\n' % json.dumps([u_dst_file] + lx_data))
+    o_file.close()
+
+    os.rename(u_tmp_file, pu_file)
+
+
+def _up_to_date(pu_src_path, pu_dst_path, pdlx_journal):
+    """
+    Function to check if a destination file is up to date: it has the same size and modification time than the source
+    (i.e. links or copies done in incremental mode), or the journal says it was copied from the same source and neither
+    file has changed since then.
+
+    :param pu_src_path: Source file.
+
+    :param pu_dst_path: Destination file.
+
+    :param pdlx_journal: Journal of the destination dir. See _journal_load().
+
+    :return: True/False.
+    """
+
+    try:
+        li_fingerprint = _fingerprint(os.stat(pu_src_path), os.stat(pu_dst_path))
+    except OSError:
+        return False
+
+    if li_fingerprint[0:2] == li_fingerprint[2:4]:
+        b_up_to_date = True
+    else:
+        lx_entry = pdlx_journal.get(os.path.basename(pu_dst_path))
+        b_up_to_date = lx_entry == [os.path.abspath(pu_src_path)] + li_fingerprint
+
+    return b_up_to_date
+
+
 def _regex_catcher(u_text, u_pattern=None, i_group=None):
     """
     Function to capture a text inside a longer string using regex pattern.
@@ -252,7 +530,8 @@ def _regex_catcher(u_text, u_pattern=None, i_group=None):
 # MAIN FUNCTION
 #=======================================================================================================================
 def hq_copy(po_dat=None, pu_src_path=u'', pu_dst_dir=u'', pu_src_fmt=u'', pu_dst_fmt=u'', pb_sim=False,
-            pi_print_mode=0, pu_regex_pattern=None, pi_regex_group=None, pb_del_src=False):
+            pi_print_mode=0, pu_regex_pattern=None, pi_regex_group=None, pb_del_src=False, po_changes=None,
+            pi_workers=1, pu_link_mode=u'copy', pb_incremental=False):
     """
     Renaming function for files and directories. Valid formats are crc32, md5, sha1 and real hq_title.
 
@@ -285,6 +564,23 @@ def hq_copy(po_dat=None, pu_src_path=u'', pu_dst_dir=u'', pu_src_fmt=u'', pu_dst
 
     :param i_regex_group: Number of the group to catch
 
+    :param po_changes: roms.DatDiffOut object (see hq_dat_diff.py). If present, only the files of the romsets added,
+                       renamed or changed are copied, the rest are skipped.
+
+    :param pi_workers: Number of files copied at the same time by a pool of threads. The progress output and the
+                       results are always in the same order, whatever the number of workers is. Files with the same
+                       destination are never copied at the same time.
+
+    :param pu_link_mode: Way to create the destination files: 'hard' links, 'sym' links, 'reflink' clones or regular
+                         'copy'. See files.file_link().
+
+    :param pb_del_src: Move mode. Files are renamed when source and destination are in the same device, and copied
+                       and deleted otherwise. See files.file_move(). Only valid with the 'copy' link mode.
+
+    :param pb_incremental: Incremental mode. Files whose destination is already up to date are not copied again. Copied
+                           files are registered in a journal in the destination dir (see u_JOURNAL_FILE), so an
+                           interrupted run can be resumed.
+
     :type i_print_mode int: 0-> No print at all, 1-> Print in single line mode, 2-> Print in persistent mode.
 
     :return: Statistics about the renaming process.
@@ -310,6 +606,12 @@ def hq_copy(po_dat=None, pu_src_path=u'', pu_dst_dir=u'', pu_src_fmt=u'', pu_dst
     if pu_src_fmt not in do_valid_single_modes.keys():
         raise Exception('Unknown source format "%s"' % pu_src_fmt)
 
+    if pu_link_mode not in files.tu_LINK_MODES:
+        raise Exception('Unknown link mode "%s"' % pu_link_mode)
+
+    if pb_del_src and pu_link_mode != u'copy':
+        raise Exception('Source files can\'t be moved when links are used')
+
     # Mode alias to search field relationship
     du_mode_to_field = {''}
 
@@ -322,8 +624,11 @@ def hq_copy(po_dat=None, pu_src_path=u'', pu_dst_dir=u'', pu_src_fmt=u'', pu_dst
     if o_src_path.is_file():
         lo_files_to_process.append(o_src_path)
     elif o_src_path.is_dir():
+        # The journal (and its temporary file) of a previous run may be in the source dir, i.e. when copying the output
+        # of hq_copy again, and it's not a file to copy.
+        tu_journal_files = (u_JOURNAL_FILE, u'%s.tmp' % u_JOURNAL_FILE)
         for o_src_fp in o_src_path.content():
-            if o_src_fp.is_file():
+            if o_src_fp.is_file() and o_src_fp.u_file not in tu_journal_files:
                 lo_files_to_process.append(o_src_fp)
 
     # Stats initialization
@@ -333,12 +638,26 @@ def hq_copy(po_dat=None, pu_src_path=u'', pu_dst_dir=u'', pu_src_fmt=u'', pu_dst
 
     lu_ren_files = []
     lu_unk_files = []
+    lu_skp_files = []
+    lu_upd_files = []
 
-    # Processing of the files
-    i_file = 0
-    for o_src_fp in lo_files_to_process:
-        i_file += 1
+    u_journal_file = os.path.join(o_dst_dir.u_path, u_JOURNAL_FILE)
+    dlx_journal = {}
+    if pb_incremental:
+        dlx_journal = _journal_load(u_journal_file)
+
+    su_changed_ids = None
+    if po_changes is not None:
+        su_changed_ids = po_changes.new_ids()
+
+    # Source name -> (romset id, destination name) table, built in a single pass over the dat, so each file just
+    # needs a dictionary lookup.
+    dtu_copy_map = _copy_map_build(po_dat, do_valid_single_modes[pu_src_fmt].u_field,
+                                   do_valid_single_modes[pu_dst_fmt].u_field)
 
+    # Resolution of the destination names. Nothing is copied yet.
+    ltu_jobs = []
+    for o_src_fp in lo_files_to_process:
         # If the regex mode is not active, the full name of the file is used to find a game in the database. But with
         # regex matching, just part of the filename is used.
         if None in (pu_regex_pattern, pi_regex_group):
@@ -346,30 +665,30 @@ def hq_copy(po_dat=None, pu_src_path=u'', pu_dst_dir=u'', pu_src_fmt=u'', pu_dst
         else:
             u_caught_name = _regex_catcher(o_src_fp.u_name, pu_regex_pattern, pi_regex_group)
 
-        try:
-            o_romset = po_dat.get_romsets_by_field(do_valid_single_modes[pu_src_fmt].u_field, True, u_caught_name)[0]
-        except IndexError:
-            o_romset = None
+        tu_match = dtu_copy_map.get(u_caught_name)
+        u_dst_path = None
 
-        if o_romset:
+        if tu_match and su_changed_ids is not None and tu_match[0] not in su_changed_ids:
+            lu_skp_files.append(o_src_fp.u_path)
+            u_dst_file_name = u'-- UNCHANGED --'
+            u_copy_text = u'-'
+
+        elif tu_match:
             i_files_recognized += 1
             lu_ren_files.append(o_src_fp.u_path)
 
-            u_output_name = getattr(o_romset, do_valid_single_modes[pu_dst_fmt].u_field)
+            u_output_name = tu_match[1]
 
             o_dst_file_object = files.FilePath(o_dst_dir.u_path, u'%s.%s' % (u_output_name, o_src_fp.u_ext))
             u_dst_file_name = o_dst_file_object.u_file
 
-            if pb_sim:
+            if pb_incremental and _up_to_date(o_src_fp.u_path, o_dst_file_object.u_path, dlx_journal):
+                lu_upd_files.append(o_src_fp.u_path)
+                u_copy_text = u'='
+            elif pb_sim:
                 u_copy_text = u's'
             else:
-                i_files_renamed += 1
-                shutil.copy(o_src_fp.u_path, o_dst_file_object.u_path)
-
-                # TODO: Fix this nasty hack since doesn't show any success/fail result for delete.
-                if pb_del_src:
-                    os.remove(o_src_fp.u_path)
-
+                u_dst_path = o_dst_file_object.u_path
                 u_copy_text = cons.u_OK_TEXT
 
         else:
@@ -377,21 +696,102 @@ def hq_copy(po_dat=None, pu_src_path=u'', pu_dst_dir=u'', pu_src_fmt=u'', pu_dst
             u_dst_file_name = u'-- UNKNOWN --'
             u_copy_text = cons.u_ER_TEXT
 
-        if pi_print_mode > 0:
-            u_output = u'%s [%i/%i] %s: %s  ->  %s: %s' % (u_copy_text,
-                                                           i_file,
-                                                           len(lo_files_to_process),
-                                                           pu_src_fmt, o_src_fp.u_file,
-                                                           pu_dst_fmt, u_dst_file_name)
-            if pi_print_mode == 1:
-                sys.stdout.write(u'\r%s' % u_output.ljust(cons.i_TERM_COLS)[0:cons.i_TERM_COLS])
-                sys.stdout.flush()
+        ltu_jobs.append((o_src_fp, u_dst_path, u_dst_file_name, u_copy_text))
+
+    # Processing of the files. With several workers, the copies are done by a pool of threads, but imap() returns the
+    # results in the original order, so the progress output is the same in both cases.
+    o_copy_start = time.now()
+    i_bytes = 0
+    di_link_modes = {}
+    lu_mov_files = []
+
+    ltu_copies = [(tu_job[0].u_path, tu_job[1], pu_link_mode, pb_del_src, pb_incremental) for tu_job in ltu_jobs]
+
+    # Several files can have the same destination (i.e. "abc (1).png" and "abc (2).png" with a regex), so the copies
+    # are grouped by destination and each group is done by a single worker, in the original order. Jobs without
+    # destination are groups on their own.
+    lli_groups = []
+    dli_groups = {}
+    for i_job, tu_copy in enumerate(ltu_copies):
+        u_dst_path = tu_copy[1]
+        if u_dst_path in dli_groups:
+            dli_groups[u_dst_path].append(i_job)
+        else:
+            lli_groups.append([i_job])
+            if u_dst_path is not None:
+                dli_groups[u_dst_path] = lli_groups[-1]
+
+    lltu_groups = [[ltu_copies[i_job] for i_job in li_group] for li_group in lli_groups]
+
+    # Each copied file is added to the journal as soon as it's done, so an interrupted run can be resumed.
+    o_journal = None
+    if pb_incremental and not pb_sim:
+        o_journal = open(u_journal_file, 'ab')
+    if pi_workers > 1:
+        o_pool = ThreadPool(pi_workers)
+        ii_group_results = o_pool.imap(_files_copy, lltu_groups)
+    else:
+        o_pool = None
+        ii_group_results = itertools.imap(_files_copy, lltu_groups)
+
+    try:
+        # Groups are sorted by their first job, so the result of each job is available once the groups up to its own
+        # have been read.
+        dtx_results = {}
+        i_group = 0
 
-            elif pi_print_mode == 2:
-                print u_output.encode('utf8')
+        i_file = 0
+        for i_job, (o_src_fp, u_dst_path, u_dst_file_name, u_copy_text) in enumerate(ltu_jobs):
+            i_file += 1
 
-            else:
-                raise ValueError
+            while i_job not in dtx_results:
+                dtx_results.update(itertools.izip(lli_groups[i_group], ii_group_results.next()))
+                i_group += 1
+            tx_result = dtx_results.pop(i_job)
+
+            if u_dst_path is not None:
+                i_files_renamed += 1
+                i_bytes += tx_result[0]
+                di_link_modes[tx_result[1]] = di_link_modes.get(tx_result[1], 0) + 1
+                if tx_result[1] == 'move':
+                    lu_mov_files.append(o_src_fp.u_path)
+
+                if o_journal is not None:
+                    lx_entry = [os.path.abspath(o_src_fp.u_path)] + tx_result[2]
+                    dlx_journal[u_dst_file_name] = lx_entry
+                    o_journal.write('%s\n' % json.dumps([u_dst_file_name] + lx_entry))
+                    o_journal.flush()
+
+            if pi_print_mode > 0:
+                u_output = u'%s [%i/%i] %s: %s  ->  %s: %s' % (u_copy_text,
+                                                               i_file,
+                                                               len(lo_files_to_process),
+                                                               pu_src_fmt, o_src_fp.u_file,
+                                                               pu_dst_fmt, u_dst_file_name)
+                if pi_print_mode == 1:
+                    sys.stdout.write(u'\r%s' % u_output.ljust(cons.i_TERM_COLS)[0:cons.i_TERM_COLS])
+                    sys.stdout.flush()
+
+                elif pi_print_mode == 2:
+                    print u_output.encode('utf8')
+
+                else:
+                    raise ValueError
+
+    finally:
+        # All the results have been read (or a copy failed), so the threads can be stopped.
+        if o_pool is not None:
+            o_pool.terminate()
+            o_pool.join()
+
+        if o_journal is not None:
+            o_journal.close()
+
+    # The journal is rewritten without the duplicated entries appended by previous runs.
+    if o_journal is not None:
+        _journal_save(u_journal_file, dlx_journal)
+
+    o_copy_end = time.now()
 
     if pi_print_mode == 1:
         # Cleaning the last line and returning the cursor to the beginning
@@ -405,7 +805,14 @@ def hq_copy(po_dat=None, pu_src_path=u'', pu_dst_dir=u'', pu_src_fmt=u'', pu_dst
     o_output = HqCopyOut()
     o_output.lu_renamed = lu_ren_files
     o_output.lu_unknown = lu_unk_files
+    o_output.lu_skipped = lu_skp_files
+    o_output.lu_moved = lu_mov_files
+    o_output.lu_uptodate = lu_upd_files
+    o_output.i_copied = i_files_renamed
+    o_output.i_bytes = i_bytes
+    o_output.di_link_modes = di_link_modes
     o_output.o_time = o_end - o_start
+    o_output.o_copy_time = o_copy_end - o_copy_start
 
     return o_output
 
@@ -424,28 +831,50 @@ if __name__ == '__main__':
     print strings.hq_title(u_PROG_NAME, u_PROG_VER)
 
     o_args = _get_cmd_options()
-    o_dat = libs.roms.RomSetContainer(o_args.u_dat_file)
-
-    dx_rename_output = hq_copy(po_dat=o_dat,
-                               pu_src_path=o_args.u_src_path, pu_dst_dir=o_args.u_dst_path,
-                               pu_src_fmt=o_args.u_src_format, pu_dst_fmt=o_args.u_dst_format,
-                               pb_sim=o_args.b_simulation,
-                               pu_regex_pattern=o_args.u_regex_pattern,
-                               pi_regex_group=o_args.i_regex_group,
-                               pi_print_mode=2)
+    o_dat = roms.RomSetContainer(o_args.u_dat_file, pb_cache=True)
+
+    o_changes = None
+    if o_args.u_changes_file:
+        o_changes = roms.diff_load(o_args.u_changes_file)
+
+    o_output = hq_copy(po_dat=o_dat,
+                       pu_src_path=o_args.u_src_path, pu_dst_dir=o_args.u_dst_path,
+                       pu_src_fmt=o_args.u_src_format, pu_dst_fmt=o_args.u_dst_format,
+                       pb_sim=o_args.b_simulation,
+                       pu_regex_pattern=o_args.u_regex_pattern,
+                       pi_regex_group=o_args.i_regex_group,
+                       pi_print_mode=2,
+                       po_changes=o_changes,
+                       pi_workers=o_args.i_workers,
+                       pu_link_mode=o_args.u_link_mode,
+                       pb_del_src=o_args.b_move,
+                       pb_incremental=o_args.b_incremental)
 
     # Some basic stats are printed to screen
-    f_renamed_percent = 100.0 * dx_rename_output['i_recog_files'] / dx_rename_output['i_total_files']
-    f_unknown_percent = 100.0 * dx_rename_output['i_unk_files'] / dx_rename_output['i_total_files']
-
-    i_length = len(str(dx_rename_output['i_total_files']))
-    u_ren_files = str(dx_rename_output['i_recog_files']).rjust(i_length)
-    u_unk_files = str(dx_rename_output['i_unk_files']).rjust(i_length)
+    i_total_files = o_output.i_renamed + o_output.i_unknown + o_output.i_skipped
+    i_length = len(str(i_total_files))
 
     u_output = u''
-    u_output += u' STATS: %s\n' % dx_rename_output['o_time']
-    u_output += u'        %i files found\n' % dx_rename_output['i_total_files']
-    u_output += u'        %s files renamed (%.2f%%)\n' % (u_ren_files, f_renamed_percent)
-    u_output += u'        %s files ignored (%.2f%%)\n' % (u_unk_files, f_unknown_percent)
+    u_output += u' STATS: %s\n' % o_output.o_time
+    u_output += u'        %i files found\n' % i_total_files
+
+    for u_label, i_files in ((u'renamed', o_output.i_renamed),
+                             (u'skipped', o_output.i_skipped),
+                             (u'ignored', o_output.i_unknown)):
+        if i_files or u_label != u'skipped':
+            u_output += u'        %s files %s (%.2f%%)\n' % (str(i_files).rjust(i_length), u_label,
+                                                           100.0 * i_files / max(i_total_files, 1))
+
+    if o_output.i_uptodate:
+        u_output += u'        %s files up to date\n' % str(o_output.i_uptodate).rjust(i_length)
+
+    u_output += u'        %s files %s in %s (%.1f files/s, %.1f MB/s)\n' % (str(o_output.i_copied).rjust(i_length),
+                                                                            (u'copied', u'moved')[o_args.b_move],
+                                                                            o_output.o_copy_time,
+                                                                            o_output.f_files_per_second,
+                                                                            o_output.f_mb_per_second)
+    if o_output.di_link_modes and (o_args.u_link_mode != u'copy' or o_args.b_move):
+        u_output += u'        %s\n' % u', '.join([u'%s: %i' % (s_mode, i_files) for s_mode, i_files
+                                                  in sorted(o_output.di_link_modes.iteritems())])
 
     print u_output
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Command line utility to find the romsets added, removed, renamed or changed between two versions of a dat file. The
+changes can be saved to a json file that can be used by hq_copy to copy just the files of the changed romsets.
+"""
+
+import argparse
+import sys
+
+from libs import cons
+from libs import files
+from libs import roms
+from libs import strings
+
+# CONSTANTS
+#=======================================================================================================================
+u_PROG_NAME = u'HQ DAT DIFF'
+u_PROG_VER = u'v2015.10.18'
+
+
+# HELPER FUNCTIONS
+#=======================================================================================================================
+def _get_cmd_options():
+    """
+    Function to process the command-line options.
+
+    :return: A dictionary with the options.
+    """
+
+    o_arg_parser = argparse.ArgumentParser(description='A command line utility to find the changes between two '
+                                                       'versions of a dat file.')
+    o_arg_parser.add_argument('old',
+                              action='store',
+                              help='Old dat file. i.e. "/home/john/snes_20150101.dat"')
+    o_arg_parser.add_argument('new',
+                              action='store',
+                              help='New dat file. i.e. "/home/john/snes_20150418.dat"')
+    o_arg_parser.add_argument('-o',
+                              action='store',
+                              default=None,
+                              help='Output json file for the changes. i.e. "/home/john/snes_changes.json"')
+    o_arg_parser.add_argument('-v',
+                              action='store_true',
+                              help='Verbose mode; all the changes are printed.')
+
+    o_args = o_arg_parser.parse_args()
+
+    i_errors = 0
+    u_text_output = u''
+
+    u_old_file = o_args.old.decode('utf8')
+    u_new_file = o_args.new.decode('utf8')
+
+    for u_label, u_file in ((u'OLD', u_old_file), (u'NEW', u_new_file)):
+        if files.FilePath(u_file).is_file():
+            u_found = cons.u_OK_TEXT
+        else:
+            u_found = cons.u_ER_TEXT
+            i_errors += 1
+        u_text_output += u'   %s: %s %s\n' % (u_label, u_found, u_file)
+
+    u_out_file = None
+    if o_args.o:
+        u_out_file = o_args.o.decode('utf8')
+        u_text_output += u'   OUT: %s %s\n' % (cons.u_OK_TEXT, u_out_file)
+
+    if i_errors:
+        u_text_output += u'\n%i errors found. Please, fix them and run the program again.' % i_errors
+
+    print u_text_output.encode('utf8', 'strict')
+
+    if i_errors:
+        sys.exit()
+
+    return {'u_old_file': u_old_file,
+            'u_new_file': u_new_file,
+            'u_out_file': u_out_file,
+            'b_verbose': o_args.v}
+
+
+# MAIN FUNCTION
+#=======================================================================================================================
+def hq_dat_diff(pu_old_file, pu_new_file, pu_out_file=None, pb_print=False, pb_verbose=False):
+    """
+    Function to find the changes between two versions of a dat file.
+
+    :param pu_old_file: Old dat file. i.e. '/home/john/snes_20150101.dat'
+
+    :param pu_new_file: New dat file. i.e. '/home/john/snes_20150418.dat'
+
+    :param pu_out_file: Json file to save the changes. If None, they are not saved.
+
+    :param pb_print: If True, a summary of the changes will be printed to screen.
+
+    :param pb_verbose: If True (and pb_print is True), every change will be printed too.
+
+    :return: A roms.DatDiffOut object.
+    """
+
+    o_old_dat, o_new_dat = roms.load_dats([pu_old_file, pu_new_file], pi_workers=2, pb_cache=True)
+
+    o_diff = roms.diff(o_old_dat, o_new_dat)
+
+    if pu_out_file:
+        o_diff.save(pu_out_file)
+
+    if pb_print:
+        if pb_verbose:
+            for du_romset in o_diff.ldu_added:
+                print (u'     + %s' % du_romset['u_name']).encode('utf8')
+            for du_romset in o_diff.ldu_removed:
+                print (u'     - %s' % du_romset['u_name']).encode('utf8')
+            for ddu_change in o_diff.lddu_renamed:
+                print (u'     > %s  ->  %s' % (ddu_change['old']['u_name'], ddu_change['new']['u_name'])).encode('utf8')
+            for ddu_change in o_diff.lddu_changed:
+                print (u'     * %s' % ddu_change['new']['u_name']).encode('utf8')
+            print
+
+        print u' DIFF: %i added, %i removed, %i renamed, %i changed, %i unchanged' % (o_diff.i_added,
+                                                                                      o_diff.i_removed,
+                                                                                      o_diff.i_renamed,
+                                                                                      o_diff.i_changed,
+                                                                                      o_diff.i_unchanged)
+
+    return o_diff
+
+
+# EXECUTION AS COMMAND LINE PROGRAM
+#=======================================================================================================================
+if __name__ == '__main__':
+    print strings.hq_title(u_PROG_NAME, u_PROG_VER)
+
+    dx_cmd_params = _get_cmd_options()
+
+    hq_dat_diff(dx_cmd_params['u_old_file'], dx_cmd_params['u_new_file'], pu_out_file=dx_cmd_params['u_out_file'],
+                pb_print=True, pb_verbose=dx_cmd_params['b_verbose'])
@@ -225,7 +225,7 @@ if __name__ == '__main__':
     dx_cmd_params = _get_cmd_options()
 
     if dx_cmd_params['o_dat_file'].u_path:
-        o_dat = roms.RomSetContainer(dx_cmd_params['o_dat_file'].u_path)
+        o_dat = roms.RomSetContainer(dx_cmd_params['o_dat_file'].u_path, pb_cache=True)
 
     else:
         # TODO: Why allowing not to use DAT? Not sure about it now.
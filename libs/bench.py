@@ -0,0 +1,301 @@
+"""
+Library to generate synthetic dat files and measure the performance of the rom libraries with them.
+"""
+
+import codecs
+import multiprocessing
+import os
+import random
+import resource
+from xml.sax import saxutils
+
+import roms
+import time
+
+
+# Constants
+#=======================================================================================================================
+_i_SEED = 1985                  # Seed for the random generator, so the synthetic dats are always the same.
+tu_PHASES = ('parse', 'sort', 'dedup', 'index', 'lookup')  # Phases measured by phases_measure()
+
+
+# Functions
+#=======================================================================================================================
+def cmp_dat_write(pu_file, pi_games=40000, pi_roms=1):
+    """
+    Function to write a synthetic ClrMamePro dat file.
+
+    :param pu_file: Path of the file to write. i.e. '/tmp/synthetic.dat'
+
+    :param pi_games: Number of games (romsets) of the dat.
+
+    :param pi_roms: Number of roms of each game. When it's bigger than 1, the first rom is a .cue file like in CD dats.
+
+    :return: Nothing.
+    """
+
+    o_random = random.Random(_i_SEED)
+
+    o_file = codecs.open(pu_file, 'w', 'utf8')
+
+    o_file.write(u'clrmamepro (\n')
+    o_file.write(u'\tname "HQ Tools - Synthetic"\n')
+    o_file.write(u'\tdescription "HQ Tools - Synthetic (%i games x %i roms)"\n' % (pi_games, pi_roms))
+    o_file.write(u'\tversion 20150418\n')
+    o_file.write(u'\tcomment "Synthetic dat generated for benchmarks"\n')
+    o_file.write(u')\n\n')
+
+    for i_game in range(pi_games):
+        u_game = _game_name(i_game)
+
+        o_file.write(u'game (\n')
+        o_file.write(u'\tname "%s"\n' % u_game)
+        o_file.write(u'\tdescription "%s"\n' % u_game)
+        o_file.write(u'\tyear %i\n' % (1980 + i_game % 35))
+        o_file.write(u'\tmanufacturer "Maker %i"\n' % (i_game % 97))
+
+        for u_rom, i_size, u_crc32, u_md5, u_sha1 in _roms_generate(o_random, u_game, pi_roms):
+            o_file.write(u'\trom ( name "%s" size %i crc %s md5 %s sha1 %s )\n' % (u_rom, i_size, u_crc32, u_md5,
+                                                                                      u_sha1))
+        o_file.write(u')\n\n')
+
+    o_file.close()
+
+
+def xml_dat_write(pu_file, pi_games=40000, pi_roms=1):
+    """
+    Function to write a synthetic XML (Logiqx) dat file. The games and roms are the same generated by cmp_dat_write().
+
+    :param pu_file: Path of the file to write. i.e. '/tmp/synthetic.xml'
+
+    :param pi_games: Number of games (romsets) of the dat.
+
+    :param pi_roms: Number of roms of each game.
+
+    :return: Nothing.
+    """
+
+    o_random = random.Random(_i_SEED)
+
+    o_file = codecs.open(pu_file, 'w', 'utf8')
+
+    o_file.write(u'<?xml version="1.0"?>\n')
+    o_file.write(u'<datafile>\n')
+    o_file.write(u'\t<header>\n')
+    o_file.write(u'\t\t<name>HQ Tools - Synthetic</name>\n')
+    o_file.write(u'\t\t<description>HQ Tools - Synthetic (%i games x %i roms)</description>\n' % (pi_games, pi_roms))
+    o_file.write(u'\t\t<version>20150418</version>\n')
+    o_file.write(u'\t\t<author>HQ Tools</author>\n')
+    o_file.write(u'\t</header>\n')
+
+    for i_game in range(pi_games):
+        u_game = saxutils.quoteattr(_game_name(i_game))
+
+        o_file.write(u'\t<game name=%s>\n' % u_game)
+        o_file.write(u'\t\t<description>%s</description>\n' % saxutils.escape(_game_name(i_game)))
+
+        for u_rom, i_size, u_crc32, u_md5, u_sha1 in _roms_generate(o_random, _game_name(i_game), pi_roms):
+            o_file.write(u'\t\t<rom name=%s size="%i" crc="%s" md5="%s" sha1="%s"/>\n' % (saxutils.quoteattr(u_rom),
+                                                                                           i_size, u_crc32, u_md5,
+                                                                                           u_sha1))
+        o_file.write(u'\t</game>\n')
+
+    o_file.write(u'</datafile>\n')
+    o_file.close()
+
+
+def phases_measure(pu_file, pu_format, pi_lookups=10000):
+    """
+    Function to measure the time needed by each phase of the loading and usage of a dat file:
+
+        - parse: Reading the dat file and building the romsets.
+        - sort: Sorting the romsets.
+        - dedup: Registering the ids of the romsets and finding the duplicated ones.
+        - index: Building the indexes of all the search fields and the individual roms.
+        - lookup: Searching random romsets by name, id (dirty md5) and rom crc32.
+
+    :param pu_file: Dat file. i.e. '/tmp/synthetic.dat'
+
+    :param pu_format: Format of the dat file, 'cmp' or 'xml'.
+
+    :param pi_lookups: Number of searches of each kind performed in the lookup phase.
+
+    :return: A dictionary with the seconds of each phase, i.e. {'f_parse': 1.2, 'f_sort': 0.1...}, the number of
+             lookups performed 'i_lookups' and the number of games 'i_games'.
+    """
+
+    o_container = roms.RomSetContainer()
+
+    if pu_format == 'cmp':
+        px_reader = o_container._read_from_cmp
+    else:
+        px_reader = o_container._read_from_xml
+
+    dx_times = {}
+
+    dx_times['f_parse'] = time_call(px_reader, pu_file)[0]
+
+    # Ids are registered while the romsets are added, so they are registered again from scratch to time that part. It's
+    # done before sorting, so the romsets are registered in the same order than the first time.
+    def _ids_register():
+        o_container._do_romsets_by_id = {}
+        o_container._dsu_duplicates = {}
+        for o_romset in o_container.lo_games:
+            o_container._id_register(o_romset)
+        return o_container._duplicates_found()
+
+    dx_times['f_dedup'] = time_call(_ids_register)[0]
+    dx_times['f_sort'] = time_call(o_container._sort)[0]
+
+    def _indexes_build():
+        for s_field in o_container._tu_valid_search_fields:
+            o_container._index_get(s_field)
+        for s_attribute in roms._ds_ROM_SEARCH_FIELDS.itervalues():
+            o_container._rom_index_get(s_attribute)
+
+    dx_times['f_index'] = time_call(_indexes_build)[0]
+
+    o_random = random.Random(_i_SEED)
+    lo_romsets = [o_random.choice(o_container.lo_games) for i_lookup in range(pi_lookups)]
+
+    def _lookups():
+        for o_romset in lo_romsets:
+            o_container.get_romsets_by_field('u_name', True, o_romset.u_name)
+            o_container.get_romsets_by_field('u_dmd5', True, o_romset.u_dmd5)
+            o_container.get_roms_by_field('u_crc32', o_romset.lo_roms[0].u_crc32)
+
+    dx_times['f_lookup'] = time_call(_lookups)[0]
+    dx_times['i_lookups'] = pi_lookups * 3
+    dx_times['i_games'] = o_container.i_games
+
+    return dx_times
+
+
+def profile_call(px_function, *px_args, **dx_kwargs):
+    """
+    Function to measure the time and the memory a function needs to run. The function is run in a child process, so
+    the measures are not affected by the memory previously used by the caller.
+
+    :param px_function: Function to run. It must be defined at module level (so it can be pickled).
+
+    :param px_args: Positional arguments for the function.
+
+    :param dx_kwargs: Keyword arguments for the function.
+
+    :return: A dictionary with the elapsed seconds 'f_time', the resident memory in KiB of the child process before
+             the call 'i_base_kb', after the call 'i_final_kb', and the peak during the call 'i_peak_kb', and the output
+             of the function 'x_output' (it must be picklable).
+    """
+
+    o_queue = multiprocessing.Queue()
+    o_process = multiprocessing.Process(target=_profile_child, args=(o_queue, px_function, px_args, dx_kwargs))
+    o_process.start()
+    dx_results = o_queue.get()
+    o_process.join()
+
+    return dx_results
+
+
+def rss_kb():
+    """
+    Function to get the current resident memory of the process.
+
+    :return: Resident memory in KiB. 0 if it can't be obtained (only Linux /proc is supported).
+    """
+
+    try:
+        o_file = open('/proc/self/statm', 'r')
+        i_pages = int(o_file.read().split()[1])
+        o_file.close()
+        i_kb = i_pages * resource.getpagesize() / 1024
+
+    except (IOError, IndexError, ValueError):
+        i_kb = 0
+
+    return i_kb
+
+
+def time_call(px_function, *px_args, **dx_kwargs):
+    """
+    Function to measure the time a function needs to run.
+
+    :param px_function: Function to run.
+
+    :param px_args: Positional arguments for the function.
+
+    :param dx_kwargs: Keyword arguments for the function.
+
+    :return: A tuple (elapsed seconds, output of the function).
+    """
+
+    o_start = time.now()
+    x_output = px_function(*px_args, **dx_kwargs)
+    o_end = time.now()
+
+    return (o_end - o_start).total_seconds(), x_output
+
+
+# Helper Functions
+#=======================================================================================================================
+def _profile_child(po_queue, px_function, ptx_args, pdx_kwargs):
+    """
+    Function run inside the child process created by profile_call().
+    """
+
+    i_base_kb = rss_kb()
+    f_time, x_output = time_call(px_function, *ptx_args, **pdx_kwargs)
+    i_final_kb = rss_kb()
+
+    # In Linux, ru_maxrss is measured in KiB.
+    i_peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, i_final_kb)
+
+    po_queue.put({'f_time': f_time,
+                  'i_base_kb': i_base_kb,
+                  'i_final_kb': i_final_kb,
+                  'i_peak_kb': i_peak_kb,
+                  'x_output': x_output})
+
+
+def _game_name(pi_game):
+    """
+    Function to build the name of a synthetic game. Names contain spaces and parenthesis like the real ones.
+
+    :param pi_game: Number of the game. i.e. 25
+
+    :return: The name of the game. i.e. u'Synthetic Game 00025 (Europe) (En,Fr)'
+    """
+
+    tu_regions = (u'Europe', u'USA', u'Japan', u'World')
+    return u'Synthetic Game %05i (%s) (En,Fr)' % (pi_game, tu_regions[pi_game % len(tu_regions)])
+
+
+def _roms_generate(po_random, pu_game, pi_roms):
+    """
+    Function to generate the data of the roms of a synthetic game.
+
+    :param po_random: random.Random object.
+
+    :param pu_game: Name of the game.
+
+    :param pi_roms: Number of roms.
+
+    :return: A list of tuples (name, size, crc32, md5, sha1).
+    """
+
+    ltx_roms = []
+
+    for i_rom in range(pi_roms):
+        if pi_roms == 1:
+            u_rom = u'%s.bin' % pu_game
+        elif i_rom == 0:
+            u_rom = u'%s.cue' % pu_game
+        else:
+            u_rom = u'%s (Track %02i).bin' % (pu_game, i_rom)
+
+        ltx_roms.append((u_rom,
+                         po_random.randint(1024, 700 * 1024 * 1024),
+                         u'%08x' % po_random.getrandbits(32),
+                         u'%032x' % po_random.getrandbits(128),
+                         u'%040x' % po_random.getrandbits(160)))
+
+    return ltx_roms
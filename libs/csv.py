@@ -5,6 +5,11 @@ Library to read and write csv files.
 import codecs
 
 
+# Constants
+#=======================================================================================================================
+_i_WRITE_BUFFER = 1024 * 1024   # Size of the write buffer of CsvWriter objects
+
+
 # Classes
 #=======================================================================================================================
 class ParsedCsv:
@@ -205,6 +210,63 @@ class ParsedCsv:
         o_file.close()
 
 
+class CsvWriter:
+    """
+    Class to write a csv file row by row, without keeping the data in memory. The output format is the same produced by
+    ParsedCsv.save_to_disk(): comment lines first, then the headings and the data rows.
+    """
+    def __init__(self, pu_file, pu_sep=u',', pu_com=u'#'):
+        self.u_sep = pu_sep
+        self.u_com = pu_com
+        self.i_rows = 0        # Number of data rows written
+
+        self._o_file = open(pu_file, 'wb', _i_WRITE_BUFFER)
+
+    def write_comment(self, pu_comment):
+        """
+        Method to write a comment line.
+
+        :param pu_comment: Text of the comment. i.e. u'Dat Name: Nintendo - Super Nintendo'
+
+        :return: Nothing
+        """
+
+        self._o_file.write((u'%s %s\n' % (self.u_com, pu_comment)).encode('utf8'))
+
+    def write_headings(self, plu_headings):
+        """
+        Method to write the headings row.
+
+        :param plu_headings: List of unicode headings. i.e. [u'CRC32', u'Game Name', u'Year']
+
+        :return: Nothing
+        """
+
+        self._o_file.write((u'%s\n' % self.u_sep.join(plu_headings)).encode('utf8'))
+
+    def write_row(self, plu_row):
+        """
+        Method to write a data row. Unlike ParsedCsv.append_row(), the elements are not converted nor stripped, they
+        must be unicode strings already.
+
+        :param plu_row: List of unicode elements. i.e. [u'a209fe80', u'Super Mario World (Europe)', u'1990']
+
+        :return: Nothing
+        """
+
+        self._o_file.write((u'%s\n' % self.u_sep.join(plu_row)).encode('utf8'))
+        self.i_rows += 1
+
+    def close(self):
+        """
+        Method to flush the pending data and close the file.
+
+        :return: Nothing
+        """
+
+        self._o_file.close()
+
+
 # Helper Functions
 #=======================================================================================================================
 def _line_clean(pu_line):
@@ -2,7 +2,39 @@
 Library with file tools.
 """
 
+import ctypes
+import ctypes.util
+import errno
+import fcntl
 import os
+import shutil
+import tempfile
+
+# Kernel-side copies are done calling the C library directly (python 2 doesn't include os.sendfile). copy_file_range()
+# requires glibc 2.27, so any of the functions can be missing.
+try:
+    _o_LIBC = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+except OSError:
+    _o_LIBC = None
+
+_px_COPY_FILE_RANGE = getattr(_o_LIBC, 'copy_file_range', None)
+if _px_COPY_FILE_RANGE is not None:
+    _px_COPY_FILE_RANGE.restype = ctypes.c_ssize_t
+    _px_COPY_FILE_RANGE.argtypes = (ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t,
+                                    ctypes.c_uint)
+
+_px_SENDFILE = getattr(_o_LIBC, 'sendfile', None)
+if _px_SENDFILE is not None:
+    _px_SENDFILE.restype = ctypes.c_ssize_t
+    _px_SENDFILE.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t)
+
+
+# Constants
+#=======================================================================================================================
+tu_LINK_MODES = ('hard', 'sym', 'reflink', 'copy')  # Ways to put a file in another place. See file_link().
+_i_FICLONE = 0x40049409                             # ioctl to clone a file in copy-on-write filesystems (btrfs, xfs)
+_i_COPY_CHUNK = 64 * 1024 * 1024                    # Bytes requested to the kernel in each copy call
+_ti_COPY_UNSUPPORTED = (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF)
 
 
 # IMPORTANT COMMENT: In order to make @property and setters work, you need to define the class using OBJECT between
@@ -219,8 +251,8 @@ class FilePath(object):
             return o_matched_fp
 
 
-
-
+# Functions
+#=======================================================================================================================
 def get_cwd():
     """
     Function to get the current working directory.
@@ -252,4 +284,261 @@ def read_nlines(po_file, pi_lines):
     except IOError:
         pass
 
-    return lu_lines
\ No newline at end of file
+    return lu_lines
+
+
+def file_copy(pu_src, pu_dst, pb_sync=False):
+    """
+    Function to copy a file, like shutil.copy() does (data and permission bits), but letting the kernel move the data
+    when possible (copy_file_range() or sendfile()), so it doesn't go through user space.
+
+    :param pu_src: Source file. i.e. '/home/ann/145879ab.png'
+
+    :param pu_dst: Destination file. i.e. '/home/cecil/output_pics/Super Mario World (Europe).png'
+
+    :param pb_sync: If True, the function doesn't return until the data of the destination is written to the disk.
+
+    :return: Nothing.
+    """
+
+    o_src_file = open(pu_src, 'rb')
+    try:
+        o_dst_file = open(pu_dst, 'wb')
+        try:
+            if not _kernel_copy(o_src_file.fileno(), o_dst_file.fileno()):
+                shutil.copyfileobj(o_src_file, o_dst_file, 1024 * 1024)
+
+            if pb_sync:
+                o_dst_file.flush()
+                os.fsync(o_dst_file.fileno())
+        finally:
+            o_dst_file.close()
+    finally:
+        o_src_file.close()
+
+    shutil.copymode(pu_src, pu_dst)
+
+
+def file_link(pu_src, pu_dst, pu_mode='copy'):
+    """
+    Function to put a file in another place without copying its data when possible:
+
+        - 'hard': A hard link (same file with two names). Only possible inside the same filesystem.
+        - 'sym': A symbolic link to the absolute path of the source.
+        - 'reflink': A copy-on-write clone (btrfs, xfs...). Data blocks are shared until any of the files is modified.
+        - 'copy': A regular copy. See file_copy().
+
+    When a hard link or a clone is not possible (i.e. different devices or a filesystem without copy-on-write), a
+    regular copy is done instead. An existing destination is replaced, unless it's already a link to the source made
+    with the same mode (links made with another mode are replaced too).
+
+    :param pu_src: Source file. i.e. '/home/ann/145879ab.png'
+
+    :param pu_dst: Destination file. i.e. '/home/cecil/output_pics/Super Mario World (Europe).png'
+
+    :param pu_mode: Mode, one of tu_LINK_MODES. i.e. 'hard'
+
+    :return: The mode actually used. i.e. 'copy' when 'hard' was requested but the files are in different devices.
+    """
+
+    if pu_mode not in tu_LINK_MODES:
+        raise ValueError('Unknown link mode "%s", it must be one of %s' % (pu_mode, str(tu_LINK_MODES)))
+
+    if os.path.lexists(pu_dst):
+        b_link = os.path.islink(pu_dst)
+        if os.path.exists(pu_dst) and os.path.samefile(pu_src, pu_dst):
+            if (pu_mode == 'hard' and not b_link) or (pu_mode == 'sym' and b_link):
+                return pu_mode
+
+            # A destination linked to the source in another way is just another name of the data, so it's removed
+            # below. But not when it's the name where the source really is (the data would be lost).
+            u_dst_entry = os.path.join(os.path.realpath(os.path.dirname(os.path.abspath(pu_dst))),
+                                       os.path.basename(pu_dst))
+            if os.path.realpath(pu_src) == u_dst_entry:
+                raise shutil.Error('"%s" and "%s" are the same file' % (pu_src, pu_dst))
+
+        # Writing over the old destination could modify other files linked to it, so it's removed instead.
+        os.remove(pu_dst)
+
+    s_mode = pu_mode
+
+    if pu_mode == 'hard':
+        try:
+            os.link(pu_src, pu_dst)
+        except OSError as o_error:
+            if o_error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            s_mode = 'copy'
+
+    elif pu_mode == 'sym':
+        os.symlink(os.path.abspath(pu_src), pu_dst)
+
+    elif pu_mode == 'reflink':
+        if not _reflink(pu_src, pu_dst):
+            s_mode = 'copy'
+
+    if s_mode == 'copy':
+        file_copy(pu_src, pu_dst)
+
+    return s_mode
+
+
+def file_move(pu_src, pu_dst):
+    """
+    Function to move a file. Inside the same filesystem, the file is just renamed, which is atomic and doesn't copy
+    any data. When it can't be renamed (i.e. different devices), the file is copied to a temporary file next to the
+    destination, written to the disk, renamed to the final name and, only then, the source is deleted. So, in both
+    cases, the destination never contains a partial file and the source is never deleted before the destination is
+    safe.
+
+    An existing destination is replaced (a symbolic link is replaced too, instead of the file it points to).
+
+    :param pu_src: Source file. i.e. '/home/ann/145879ab.png'
+
+    :param pu_dst: Destination file. i.e. '/home/cecil/output_pics/Super Mario World (Europe).png'
+
+    :return: 'move' if the file was renamed, 'copy' if it was copied (and the source deleted).
+    """
+
+    u_dst_dir = os.path.dirname(os.path.abspath(pu_dst))
+
+    # A symbolic link in the destination (i.e. made by file_link()) is replaced like any other file, even when it
+    # points to the source. The source can't be moved over itself nor over the file it links to.
+    u_src_entry = os.path.join(os.path.realpath(os.path.dirname(os.path.abspath(pu_src))), os.path.basename(pu_src))
+    u_dst_entry = os.path.join(os.path.realpath(u_dst_dir), os.path.basename(pu_dst))
+
+    b_same_file = u_src_entry == u_dst_entry
+    if not os.path.islink(pu_dst) and os.path.realpath(pu_src) == os.path.realpath(pu_dst):
+        b_same_file = True
+
+    if b_same_file:
+        raise shutil.Error('"%s" and "%s" are the same file' % (pu_src, pu_dst))
+
+    s_mode = 'move'
+
+    # A hard link of the source (i.e. made by file_link()) already contains the data, the source name is just removed.
+    if os.path.exists(pu_dst) and not os.path.islink(pu_dst) and os.path.samefile(pu_src, pu_dst):
+        os.remove(pu_src)
+
+    else:
+        # Comparing the devices is not enough, i.e. two bind mounts of the same filesystem can't rename between them.
+        try:
+            os.rename(pu_src, pu_dst)
+        except OSError as o_error:
+            if o_error.errno != errno.EXDEV:
+                raise
+            s_mode = 'copy'
+
+    if s_mode == 'copy':
+        i_fd, u_tmp_file = tempfile.mkstemp(prefix=u'.hq_', suffix=u'.tmp', dir=u_dst_dir)
+        os.close(i_fd)
+
+        try:
+            file_copy(pu_src, u_tmp_file, pb_sync=True)
+            os.rename(u_tmp_file, pu_dst)
+        except BaseException:
+            if os.path.exists(u_tmp_file):
+                os.remove(u_tmp_file)
+            raise
+
+        _dir_sync(u_dst_dir)
+        os.remove(pu_src)
+
+    return s_mode
+
+
+# Helper Functions
+#=======================================================================================================================
+def _dir_sync(pu_dir):
+    """
+    Function to write to the disk the changes of the entries of a directory (i.e. a renamed file).
+
+    :param pu_dir: Directory. i.e. '/home/cecil/output_pics'
+
+    :return: Nothing.
+    """
+
+    i_fd = os.open(pu_dir, os.O_RDONLY)
+    try:
+        os.fsync(i_fd)
+    except OSError as o_error:
+        # Some filesystems (i.e. network ones) don't support it.
+        if o_error.errno not in (errno.EINVAL, errno.EBADF):
+            raise
+    finally:
+        os.close(i_fd)
+
+
+def _kernel_copy(pi_src_fd, pi_dst_fd):
+    """
+    Function to copy the data between two opened files inside the kernel. copy_file_range() is tried first (it can
+    even clone the data in some filesystems), and then sendfile() (it works between different filesystems in any Linux
+    since 2.6.33).
+
+    :param pi_src_fd: File descriptor of the source, at its beginning.
+
+    :param pi_dst_fd: File descriptor of the destination, empty.
+
+    :return: True if the data was copied, False if the kernel can't do it (nothing was copied then).
+    """
+
+    # (function name, function to call it)
+    ltx_methods = []
+    if _px_COPY_FILE_RANGE is not None:
+        ltx_methods.append(('copy_file_range',
+                            lambda: _px_COPY_FILE_RANGE(pi_src_fd, None, pi_dst_fd, None, _i_COPY_CHUNK, 0)))
+    if _px_SENDFILE is not None:
+        ltx_methods.append(('sendfile', lambda: _px_SENDFILE(pi_dst_fd, pi_src_fd, None, _i_COPY_CHUNK)))
+
+    for s_method, px_call in ltx_methods:
+        i_copied = 0
+        while True:
+            i_bytes = px_call()
+            if i_bytes == 0:
+                return True
+
+            elif i_bytes < 0:
+                i_errno = ctypes.get_errno()
+                # If the method is not supported, nothing has been copied yet and the next method can be tried.
+                if i_copied == 0 and i_errno in _ti_COPY_UNSUPPORTED:
+                    break
+                raise OSError(i_errno, '%s failed: %s' % (s_method, os.strerror(i_errno)))
+
+            i_copied += i_bytes
+
+    return False
+
+
+def _reflink(pu_src, pu_dst):
+    """
+    Function to clone a file in a copy-on-write filesystem using the FICLONE ioctl.
+
+    :param pu_src: Source file.
+
+    :param pu_dst: Destination file. It must not exist.
+
+    :return: True if the clone was done, False if it's not supported (the destination is not created then).
+    """
+
+    b_cloned = False
+
+    o_src_file = open(pu_src, 'rb')
+    try:
+        o_dst_file = open(pu_dst, 'wb')
+        try:
+            fcntl.ioctl(o_dst_file.fileno(), _i_FICLONE, o_src_file.fileno())
+            b_cloned = True
+        except IOError as o_error:
+            if o_error.errno not in _ti_COPY_UNSUPPORTED:
+                raise
+        finally:
+            o_dst_file.close()
+    finally:
+        o_src_file.close()
+
+    if b_cloned:
+        shutil.copymode(pu_src, pu_dst)
+    else:
+        os.remove(pu_dst)
+
+    return b_cloned
@@ -145,12 +145,13 @@ def lconvert(pu_src_fmt=None, pu_dst_fmt=None, pu_src_file=None, pu_dst_file=Non
         o_id_field = roms.Field(0, 'u_ccrc32')
         lo_import_fields = [roms.Field(1, 'i_year'),
                             roms.Field(2, 'u_auth')]
-        po_dat.csv_import(po_csv=o_meta_file_csv,
-                          po_id_field=o_id_field,
-                          plo_fields=lo_import_fields,
-                          pb_overwrite=True)
+        o_import_output = po_dat.csv_import(po_csv=o_meta_file_csv,
+                                            po_id_field=o_id_field,
+                                            plo_fields=lo_import_fields,
+                                            pb_overwrite=True)
         if pb_print:
-            print 'META-DATA IMPORTED'
+            print 'META-DATA IMPORTED (%i rows matched, %i unmatched)' % (o_import_output.i_matched,
+                                                                        o_import_output.i_unmatched)
 
     # 3rd we try to find those romsets in the RomSetContainer
     do_dst_romsets = {}
@@ -287,10 +288,11 @@ def lst_write(po_dat=None, pdo_romsets=None, pu_file=u'', pu_format=u''):
 
 # DAT LISTS: Yes, dat files are an (kind of hacky) input list format
 #=======================================================================================================================
-# To avoid any hack or workaround, I'm actually reading and parsing again the same dat file I already had. Slow...
+# To avoid any hack or workaround, I'm actually reading again the same dat file I already had. Thanks to the compiled
+# cache of the dat, it's not parsed again.
 def _dat_read(po_file_fp=None):
     lo_romsets_found = []
-    o_romset_container = roms.RomSetContainer(po_file_fp.u_path)
+    o_romset_container = roms.RomSetContainer(po_file_fp.u_path, pb_cache=True)
     for o_romset in o_romset_container:
         o_match = RomSetMatch(pu_name=o_romset.u_name)
         lo_romsets_found.append(o_match)
@@ -1,10 +1,28 @@
 #!/usr/bin/env
 # -*- coding: utf-8 -*-
 
+import bz2
 import codecs
+import gzip
+import hashlib
+import json
+import marshal
+import mmap
+import multiprocessing
+import operator
 import xml.etree.cElementTree
 import os                       # OS utils
 import re
+import zipfile
+
+# lzma is only included in python 3, in python 2 the backports.lzma module is needed to read .xz DATs.
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
 
 import csv
 
@@ -13,12 +31,65 @@ import csv
 #=======================================================================================================================
 _u_VERSION = u'2015-04-18'                                          # Version of the library
 lu_IGNORE_EXTS = [u'cue']
+_tu_FILTER_METHODS = ('equals', 'in', 'range', 'regex', 'prefix')  # Valid methods for Filter objects
+
+# Compound hashes and sizes cache of _RomSet (keys in the same order they are stored in the cache tuple)
+_tu_CACHE_KEYS = (u'ccrc32', u'dcrc32', u'cmd5', u'dmd5', u'csha1', u'dsha1', u'csize', u'dsize')
+_di_CACHE_POSITIONS = dict([(u_key, i_pos) for i_pos, u_key in enumerate(_tu_CACHE_KEYS)])
+_i_CRC32_MASK = (1 << 32) - 1                                       # Compound hashes are truncated to the length of
+_i_MD5_MASK = (1 << 128) - 1                                        # the hash using these masks.
+_i_SHA1_MASK = (1 << 160) - 1
+
+# Individual rom indexes (search field -> _Rom attribute). Romset and rom positions are packed in a single integer.
+_ds_ROM_SEARCH_FIELDS = {'u_crc32': 'i_crc32', 'u_md5': 'i_md5', 'u_sha1': 'i_sha1', 'i_size': 'i_size'}
+_i_ROM_POSITION_BITS = 16
+_i_ROM_POSITION_MASK = (1 << _i_ROM_POSITION_BITS) - 1
+
+# Compiled DAT cache
+u_DAT_CACHE_EXT = u'hqcache'                                        # Extension of the compiled DAT cache files
+_i_DAT_CACHE_VERSION = 3                                            # Increase it when the parsers or objects change
+u_DAT_INDEX_EXT = u'hqindex'                                        # Extension of the offset indexes of lazy containers
+_tu_LAZY_INDEX_FIELDS = ('u_name', 'u_desc', 'u_ccrc32', 'u_dcrc32', 'u_cmd5', 'u_dmd5', 'u_csha1', 'u_dsha1')
+
+# DAT parsing
+_i_PARSE_BATCH = 5000                                               # Romsets added at once to the container by parsers
+
+# ClrMamePro DAT parsing
+_tu_CMP_HEAD_BLOCKS = (u'clrmamepro', u'emulator')                  # Blocks containing the heading of the DAT
+_tu_CMP_GAME_BLOCKS = (u'game', u'machine')                         # Blocks containing romsets
+_tu_CMP_ROM_FIELDS = (u'name', u'size', u'crc', u'md5', u'sha1', u'merge', u'status', u'date', u'flags', u'region',
+                      u'serial', u'offset')                         # Known fields inside rom lines
+_o_CMP_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)', re.UNICODE)        # Quoted string or chunk of non-space chars
+_o_CMP_GAME_START_RE = re.compile(r'(?:%s) \(\s*$' % '|'.join(_tu_CMP_GAME_BLOCKS))  # Unindented romset start line
+_i_CMP_CHUNKS_PER_WORKER = 4                                        # Chunks of a DAT parsed by each worker process
+
+# Compressed DATs
+_tts_DAT_MAGIC_NUMBERS = (('gz', '\x1f\x8b'),
+                          ('bz2', 'BZh'),
+                          ('xz', '\xfd7zXZ\x00'),
+                          ('zip', 'PK\x03\x04'))                       # First bytes of each kind of compressed file
+
+# XML DAT parsing
+_tu_XML_GAME_TAGS = ('game', 'machine')                             # Elements containing romsets
+
+# DAT diffs
+_tu_DIFF_FIELDS = ('u_name', 'u_desc', 'u_ccrc32', 'u_dcrc32', 'u_cmd5', 'u_dmd5', 'u_csha1', 'u_dsha1')  # Stored data
 #-----------------------------------------------------------------------------------------------------------------------
 
 
 class Filter:
     """
     Class to store information about a filter that will be applied later to RomSetContainer.
+
+    Valid methods are:
+
+        - 'equals': The attribute is equal to any of the values. i.e. Filter('i_year', 'equals', 1990, 1991)
+        - 'in': Same as 'equals'.
+        - 'range': The attribute is between two values (both included). i.e. Filter('i_year', 'range', 1990, 1995)
+        - 'regex': The attribute (as text) contains the regular expression. i.e. Filter('u_desc', 'regex', r'\(Europe\)')
+        - 'prefix': The attribute (as text) starts with any of the values. i.e. Filter('u_name', 'prefix', 'Super')
+
+    Filters can be combined with FilterAnd, FilterOr and FilterNot.
     """
 
     def __init__(self, u_attribute, u_method, *x_values):
@@ -30,7 +101,15 @@ class Filter:
             if not isinstance(x_value, (unicode, str, int, float)):
                 raise Exception('ERROR, type "%s" is not valid value for a filter' % type(x_value))
 
-        # TODO: Create a check for x_values to avoid the case when you create a wrong filter with a tuple (123, 145)
+        if u_method not in _tu_FILTER_METHODS:
+            raise Exception('ERROR, method "%s" is not valid for a filter. Use one of %s' % (u_method,
+                                                                                           str(_tu_FILTER_METHODS)))
+
+        if u_method == 'range' and len(x_values) != 2:
+            raise Exception('ERROR, "range" filters need exactly two values (min, max)')
+
+        if u_method == 'regex' and len(x_values) != 1:
+            raise Exception('ERROR, "regex" filters need exactly one value (the pattern)')
 
     def __str__(self):
         u_output = u''
@@ -41,6 +120,137 @@ class Filter:
 
         return u_output.encode('utf8', 'strict')
 
+    def _compile(self):
+        """
+        Method to build the function that evaluates the filter for a romset.
+
+        :return: A function that receives a _RomSet object and returns True if it matches the filter.
+        """
+
+        px_get = operator.attrgetter(self.u_attribute)
+
+        if self.u_method in ('equals', 'in'):
+            sx_values = frozenset(self.lx_values)
+            px_match = lambda o_romset: px_get(o_romset) in sx_values
+
+        elif self.u_method == 'range':
+            x_min, x_max = self.lx_values
+            px_match = lambda o_romset: x_min <= px_get(o_romset) <= x_max
+
+        elif self.u_method == 'regex':
+            o_regex = re.compile(self.lx_values[0], re.UNICODE)
+            px_match = lambda o_romset: o_regex.search(unicode(px_get(o_romset))) is not None
+
+        else:
+            tu_prefixes = tuple([unicode(x_value) for x_value in self.lx_values])
+            px_match = lambda o_romset: unicode(px_get(o_romset)).startswith(tu_prefixes)
+
+        return px_match
+
+    def _candidates(self, po_container):
+        """
+        Method to get, using the field indexes of a container, the positions of the romsets that can match the filter.
+
+        :param po_container: RomSetContainer object.
+
+        :return: A set with the positions of the candidate romsets in po_container.lo_games, or None when the indexes
+                 can't be used for the filter (so every romset is a candidate).
+        """
+
+        si_positions = None
+
+        if self.u_method in ('equals', 'in') and self.u_attribute in po_container._tu_valid_search_fields:
+            dli_index = po_container._index_get(self.u_attribute)
+
+            si_positions = set()
+            for x_value in self.lx_values:
+                si_positions.update(dli_index.get(x_value, ()))
+
+        return si_positions
+
+
+class FilterAnd:
+    """
+    Class to combine several filters. Romsets must match ALL of them.
+    """
+
+    def __init__(self, *o_filters):
+        self.lo_filters = o_filters
+
+    def _compile(self):
+        lpx_matches = [o_filter._compile() for o_filter in self.lo_filters]
+
+        def px_match_all(o_romset):
+            for px_match in lpx_matches:
+                if not px_match(o_romset):
+                    return False
+            return True
+
+        return px_match_all
+
+    def _candidates(self, po_container):
+        # Only the filters that can use the indexes reduce the candidates. The rest are checked later romset by romset.
+        si_positions = None
+
+        for o_filter in self.lo_filters:
+            si_filter_positions = o_filter._candidates(po_container)
+            if si_filter_positions is not None:
+                if si_positions is None:
+                    si_positions = si_filter_positions
+                else:
+                    si_positions &= si_filter_positions
+
+        return si_positions
+
+
+class FilterOr:
+    """
+    Class to combine several filters. Romsets must match ANY of them.
+    """
+
+    def __init__(self, *o_filters):
+        self.lo_filters = o_filters
+
+    def _compile(self):
+        lpx_matches = [o_filter._compile() for o_filter in self.lo_filters]
+
+        def px_match_any(o_romset):
+            for px_match in lpx_matches:
+                if px_match(o_romset):
+                    return True
+            return False
+
+        return px_match_any
+
+    def _candidates(self, po_container):
+        # If just one of the filters can't use the indexes, every romset is a candidate.
+        si_positions = set()
+
+        for o_filter in self.lo_filters:
+            si_filter_positions = o_filter._candidates(po_container)
+            if si_filter_positions is None:
+                si_positions = None
+                break
+            si_positions |= si_filter_positions
+
+        return si_positions
+
+
+class FilterNot:
+    """
+    Class to negate a filter. Romsets must NOT match it.
+    """
+
+    def __init__(self, o_filter):
+        self.o_filter = o_filter
+
+    def _compile(self):
+        px_match = self.o_filter._compile()
+        return lambda o_romset: not px_match(o_romset)
+
+    def _candidates(self, po_container):
+        return None
+
 
 class Field:
     """
@@ -51,13 +261,99 @@ class Field:
         self.s_dst_field = ps_dst_field
 
 
+class CsvImportOut(object):
+    """
+    Class to contain the output of RomSetContainer.csv_import() method.
+    """
+    def __init__(self):
+        self.lu_matched = []     # Ids of the csv rows imported into a romset
+        self.lu_unmatched = []   # Ids of the csv rows without a matching romset
+
+    def _get_num_matched(self):
+        return len(self.lu_matched)
+
+    def _get_num_unmatched(self):
+        return len(self.lu_unmatched)
+
+    i_matched = property(fget=_get_num_matched)
+    i_unmatched = property(fget=_get_num_unmatched)
+
+
+class DatDiffOut(object):
+    """
+    Class to contain the output of diff() function, the changes between two versions of a DAT. Romsets are stored as
+    dictionaries with the fields in _tu_DIFF_FIELDS, so the object can be saved as json and loaded later (see save() and
+    diff_load()).
+    """
+    def __init__(self):
+        self.du_old_dat = {}     # Name, description and version of the old dat
+        self.du_new_dat = {}     # Name, description and version of the new dat
+        self.ldu_added = []      # Romsets only present in the new dat
+        self.ldu_removed = []    # Romsets only present in the old dat
+        self.lddu_renamed = []   # Romsets with the same roms but a different name. i.e. [{'old': {...}, 'new': {...}}]
+        self.lddu_changed = []   # Romsets with the same name but different roms. i.e. [{'old': {...}, 'new': {...}}]
+        self.i_unchanged = 0     # Number of romsets with the same name and roms
+
+    def _get_num_added(self):
+        return len(self.ldu_added)
+
+    def _get_num_removed(self):
+        return len(self.ldu_removed)
+
+    def _get_num_renamed(self):
+        return len(self.lddu_renamed)
+
+    def _get_num_changed(self):
+        return len(self.lddu_changed)
+
+    i_added = property(fget=_get_num_added)
+    i_removed = property(fget=_get_num_removed)
+    i_renamed = property(fget=_get_num_renamed)
+    i_changed = property(fget=_get_num_changed)
+
+    def new_ids(self):
+        """
+        Method to get the ids (dirty MD5) of the romsets of the new dat affected by the changes, the ones whose media
+        would need to be copied again.
+
+        :return: A set of ids.
+        """
+
+        su_ids = set([du_romset['u_dmd5'] for du_romset in self.ldu_added])
+        su_ids.update([ddu_change['new']['u_dmd5'] for ddu_change in self.lddu_renamed])
+        su_ids.update([ddu_change['new']['u_dmd5'] for ddu_change in self.lddu_changed])
+
+        return su_ids
+
+    def save(self, pu_file):
+        """
+        Method to save the changes to a json file.
+
+        :param pu_file: Output file. i.e. '/home/john/snes_changes.json'
+
+        :return: Nothing.
+        """
+
+        dx_data = {'old_dat': self.du_old_dat,
+                   'new_dat': self.du_new_dat,
+                   'added': self.ldu_added,
+                   'removed': self.ldu_removed,
+                   'renamed': self.lddu_renamed,
+                   'changed': self.lddu_changed,
+                   'unchanged': self.i_unchanged}
+
+        o_file = open(pu_file, 'wb')
+        json.dump(dx_data, o_file, indent=1, sort_keys=True)
+        o_file.close()
+
+
 class RomSetContainer:
     """
     Class to store a list of games, each game can contain different ROM files data. The information can be read/write to
     disk ROM file objects.
     """
 
-    def __init__(self, u_file=None):
+    def __init__(self, u_file=None, pb_cache=False, pu_cache_dir=None, pi_workers=1):
 
         # TODO: RomSetContainer should contain an internal registry with all the manipulations suffered by the object so
         #       when you export the file to disk you know the information is not coming directly from the RAW dat file.
@@ -66,7 +362,7 @@ class RomSetContainer:
 
         # Variable definition
         self.i_games = 0          # number of games stored
-        self.i_position = None    # _RomSet position for the iterator
+        self._b_sorted = True     # False when lo_games has been modified and it has to be sorted again
 
         self.u_name = u''         # internal name of the dat file.
         self.u_description = u''  # description of the dat file.
@@ -77,6 +373,9 @@ class RomSetContainer:
 
         self.lo_games = []        # list of game objects inside the dat file
 
+        self._do_romsets_by_id = {}  # romsets by id (dirty MD5). Only the first romset is stored for duplicated ids.
+        self._dsu_duplicates = {}    # names of the romsets sharing each duplicated id. i.e. {'0a1b...': set(['A', 'B'])}
+
         self._db_flags = {'from_dat': False,
                           'sets_added': False,
                           'sets_deleted': False,
@@ -88,8 +387,13 @@ class RomSetContainer:
                                         'u_csha1', 'u_dsha1',
                                         'u_desc', 'u_name', 'u_auth')
 
+        # Lazily built indexes for get_romsets_by_field(). Each key is a field from _tu_valid_search_fields and each
+        # value is a dictionary {field value: [positions of the romsets in the sorted lo_games list]}. Indexes of
+        # individual roms for get_roms_by_field() are stored here too (see _rom_index_get()).
+        self._ddli_indexes = {}
+
         if u_file:
-            self.read_from_dat(u_file)
+            self.read_from_dat(u_file, pb_cache=pb_cache, pu_cache_dir=pu_cache_dir, pi_workers=pi_workers)
 
     def __str__(self):
         u_output = u''
@@ -106,37 +410,52 @@ class RomSetContainer:
         return u_output.encode('utf8', 'strict')
 
     def __iter__(self):
-        if self.i_games > 0:
-            self.i_position = 0
-
-            # If the list is not sorted, it's sorted before iterating over it.
-            self._sort()
+        # If the list is not sorted, it's sorted before iterating over it. The iteration state lives in the returned
+        # iterator, so several loops over the same container can run at the same time (i.e. nested loops).
+        self._sort()
 
-        return self
+        return iter(self.lo_games)
 
     def __len__(self):
         return self.i_games
 
-    def next(self):
-        if (self.i_position is not None) and (self.i_position < self.i_games):
-            self.i_position += 1
-            return self.lo_games[self.i_position - 1]
-        else:
-            raise StopIteration()
-
     def _add_romset(self, o_romset):
         """
         Internal method to add games to the container WITHOUT any kind of duplicity or other kind of check.
 
+        The id of the romset (its dirty MD5) is registered anyway, so duplicated ids can be reported later by
+        _duplicates_found() and _show_duplicates() without scanning the whole container again.
+
         :param o_romset:
         """
 
         self.lo_games.append(o_romset)
         self.i_games += 1
 
+        self._id_register(o_romset)
+
+        self._b_sorted = False
+        self._indexes_reset()
+
+    def _id_register(self, po_romset):
+        """
+        Internal method to register the id of a romset, keeping track of the duplicated ones.
+
+        :param po_romset: _RomSet whose id is registered.
+
+        :return: Nothing.
+        """
+
+        u_id = po_romset.u_dmd5
+        if u_id in self._do_romsets_by_id:
+            su_names = self._dsu_duplicates.setdefault(u_id, set([self._do_romsets_by_id[u_id].u_name]))
+            su_names.add(po_romset.u_name)
+        else:
+            self._do_romsets_by_id[u_id] = po_romset
+
     def add_romset(self, o_romset):
         """
-        Method to add a new romset game to the container.
+        Method to add a new romset game to the container. The id of the romset is its dirty MD5 (u_dmd5).
 
         :param o_romset: _RomSet to add.
 
@@ -145,59 +464,58 @@ class RomSetContainer:
 
         b_added = False
 
-        if (o_romset is not None) and (not self.id_exists(o_romset.u_id)):
+        if (o_romset is not None) and (not self.id_exists(o_romset.u_dmd5)):
             self._add_romset(o_romset)
             b_added = True
 
         return b_added
 
-    def _duplicates_found(self):
+    def add_romsets(self, plo_romsets):
         """
-        Method to check the existence of duplicated ids which will break the whole idea of this project.
+        Method to add many romsets to the container at once. i.e. to merge the romsets of other container. Romsets whose
+        id already exists in the container (or earlier in plo_romsets) are skipped.
 
-        :return: True if duplicates were found, False in other case.
+        :param plo_romsets: Iterable of _RomSet objects. i.e. another RomSetContainer.
+
+        :return: Number of added romsets.
         """
 
-        lu_md5s = []
+        i_added = 0
 
-        for o_romset in self.lo_games:
-            lu_md5s.append(o_romset.u_dmd5)
+        for o_romset in plo_romsets:
+            if (o_romset is not None) and (o_romset.u_dmd5 not in self._do_romsets_by_id):
+                self.lo_games.append(o_romset)
+                self._do_romsets_by_id[o_romset.u_dmd5] = o_romset
+                i_added += 1
 
-        su_unique_md5s = set(lu_md5s)
+        if i_added:
+            self.i_games += i_added
+            self._b_sorted = False
+            self._indexes_reset()
 
-        # Since I want to be sure that I found the errors, by default I assume there are duplicated MD5s.
-        b_duplicates = True
+        return i_added
 
-        if len(lu_md5s) == len(su_unique_md5s):
-            b_duplicates = False
+    def _duplicates_found(self):
+        """
+        Method to check the existence of duplicated ids which will break the whole idea of this project.
+
+        :return: True if duplicates were found, False in other case.
+        """
 
-        return b_duplicates
+        return bool(self._dsu_duplicates)
 
     def _show_duplicates(self):
         """
         Method to quick show duplicates so you can fix the problems using other tools or manually.
 
-        WARNING! This method can be really slow.
-
-        :return: A list of lists.
+        :return: A dictionary {duplicated id: set of names of the romsets sharing it}.
         """
 
-        dlu_duplicated_romsets = {}
-
-        for o_romset in self:
-            if o_romset.u_dmd5 not in dlu_duplicated_romsets:
-                dlu_duplicated_romsets[o_romset.u_dmd5] = []
+        dsu_duplicates = {}
+        for u_id, su_names in self._dsu_duplicates.iteritems():
+            dsu_duplicates[u_id] = set(su_names)
 
-            dlu_duplicated_romsets[o_romset.u_dmd5].append(o_romset.u_name)
-
-        # Since for an A-B duplicate we check the duplicity two times A vs B, B vs A, the lists of duplicates are
-        # doubled and have to be made unique.
-        dlu_clean_duplicated_romsets = {}
-        for u_key, lu_values in dlu_duplicated_romsets.iteritems():
-            if len(lu_values) > 1:
-                dlu_clean_duplicated_romsets[u_key] = set(lu_values)
-
-        return dlu_clean_duplicated_romsets
+        return dsu_duplicates
 
     def empty(self):
         """
@@ -209,6 +527,23 @@ class RomSetContainer:
         self.lo_games = []
         self.i_games = 0
 
+        self._do_romsets_by_id = {}
+        self._dsu_duplicates = {}
+
+        self._b_sorted = True
+        self._indexes_reset()
+
+    def cache_build(self):
+        """
+        Method to compute and cache the compound hashes and sizes of all the romsets in the container that don't have
+        them yet. They are computed on demand anyway, but doing it in a single step avoids the delay when the hashes are
+        first used. See caches_build().
+
+        :return: Nothing.
+        """
+
+        caches_build(self.lo_games)
+
     def copy_metadata_from(self, o_game_container):
         """
         Method to copy meta-data information (everything but the list of games itself and the number of games) from
@@ -249,21 +584,7 @@ class RomSetContainer:
         o_csv = csv.ParsedCsv()
 
         # Comments
-        o_csv.lu_comments.append(u'   Dat Name: %s' % self.u_name)
-        o_csv.lu_comments.append(u'    Version: %s' % self.u_version)
-        o_csv.lu_comments.append(u'Description: %s' % self.u_description)
-        o_csv.lu_comments.append(u'    Comment: %s' % self.u_comment)
-        o_csv.lu_comments.append(u'     Author: %s' % self.u_author)
-        o_csv.lu_comments.append(u'       Type: %s' % self.u_type)
-        o_csv.lu_comments.append(u'      Games: %i' % self.i_games)
-
-        lu_flags = []
-        for u_key, b_value in self._db_flags.iteritems():
-            lu_flags.append(u'%s=%s' % (u_key, b_value))
-        lu_flags.sort()
-        u_flags = u' '.join(lu_flags)
-
-        o_csv.lu_comments.append(u'      Flags: %s' % u_flags)
+        o_csv.lu_comments = self._csv_comments()
 
         # Headings
         if ptu_headings:
@@ -282,59 +603,136 @@ class RomSetContainer:
 
         return o_csv
 
+    def csv_write(self, pu_file, ptu_fields=(), ptu_headings=(), pu_sep=u','):
+        """
+        Method to export the RomSetContainer data directly to a csv file. The output is the same than saving the result
+        of csv_export() with csv.ParsedCsv.save_to_disk(), but rows are written as soon as they are generated, so the
+        memory used doesn't depend on the number of games.
+
+        :param pu_file: Output csv file. i.e. '/home/john/psx.csv'
+
+        :param ptu_fields: Tuple of the fields to export, i.e. ('u_dcrc32', 'u_name', 'i_year')
+
+        :param ptu_headings: Tuple with the headings for each field. If the tuple is empty, the raw field names will be
+                             used. i.e. ('CRC32', 'Game Name', 'Year')
+
+        :param pu_sep: Separator for fields. i.e. ';'
+
+        :return: Number of rows written.
+        """
+
+        o_writer = csv.CsvWriter(pu_file, pu_sep=pu_sep)
+
+        try:
+            for u_comment in self._csv_comments():
+                o_writer.write_comment(u_comment)
+
+            if ptu_headings:
+                o_writer.write_headings(ptu_headings)
+            else:
+                o_writer.write_headings(ptu_fields)
+
+            # A single getter returns all the fields of a romset at once (compound hashes are read from its cache).
+            if ptu_fields:
+                px_getter = operator.attrgetter(*ptu_fields)
+            else:
+                px_getter = lambda o_romset: ()
+
+            for o_game in self:
+                tx_values = px_getter(o_game)
+                if len(ptu_fields) == 1:
+                    tx_values = (tx_values,)
+
+                # Values are cleaned the same way ParsedCsv.append_row() does, so the output matches csv_export().
+                o_writer.write_row([unicode(x_value).strip() for x_value in tx_values])
+
+        finally:
+            o_writer.close()
+
+        return o_writer.i_rows
+
+    def _csv_comments(self):
+        """
+        Method to build the comment lines with the metadata of the container written by csv_export() and csv_write().
+
+        :return: A list of unicode strings.
+        """
+
+        lu_comments = [u'   Dat Name: %s' % self.u_name,
+                       u'    Version: %s' % self.u_version,
+                       u'Description: %s' % self.u_description,
+                       u'    Comment: %s' % self.u_comment,
+                       u'     Author: %s' % self.u_author,
+                       u'       Type: %s' % self.u_type,
+                       u'      Games: %i' % self.i_games]
+
+        lu_flags = []
+        for u_key, b_value in self._db_flags.iteritems():
+            lu_flags.append(u'%s=%s' % (u_key, b_value))
+        lu_flags.sort()
+        u_flags = u' '.join(lu_flags)
+
+        lu_comments.append(u'      Flags: %s' % u_flags)
+
+        return lu_comments
+
     def csv_import(self, po_csv=None, po_id_field=None, plo_fields=None, pb_overwrite=False):
         """
         Method to import data from a csv object.
 
-        :param po_csv: Csv object from csv library.
+        The romsets are found using the index of the identification field (see _index_get()), so each row is matched
+        in constant time instead of scanning the whole container.
+
+        :param po_csv: Csv object from csv library, or a list of them to import several csv files in one call.
         :param po_id_field: Field object indicating the csv column to use as identification field and the name of that
                             field. WARNING: Using a non-unique field as identification field can lead to import data to
                             the wrong SETs.
         :param plo_fields: List of Field objects indicating which columns to import.
         :param pb_overwrite: If True, imported data will overwrite the previous existing data. If False, previous data
                              will be kept.
-        :return: Nothing.
+        :return: A CsvImportOut object with the ids of the matched and unmatched rows.
         """
 
+        o_output = CsvImportOut()
+
         if po_id_field and plo_fields:
             self._db_flags['data_imported'] = True
 
-            for lu_row in po_csv.llu_rows:
-                u_csv_id = lu_row[po_id_field.i_src_column]
-                for o_romset in self:
-                    if getattr(o_romset, po_id_field.s_dst_field) == u_csv_id:
-                        for o_update_field in plo_fields:
-                            if o_update_field.s_dst_field == 'i_year':
-                                if pb_overwrite or o_romset.i_year == 0:
-                                    o_romset.i_year = int(lu_row[o_update_field.i_src_column])
-
-                            elif o_update_field.s_dst_field == 'u_desc':
-                                # Description field always has content so no need to check for "empty".
-                                if pb_overwrite:
-                                    o_romset.u_desc = lu_row[o_update_field.i_src_column]
-
-                            elif o_update_field.s_dst_field == 'u_auth':
-                                if pb_overwrite or o_romset.u_mfr == u'':
-                                    o_romset.u_mfr = lu_row[o_update_field.i_src_column]
-
-                            # TODO: Add new fields to romset like genre, number of players, etc... that can be imported
-                            else:
-                                raise ValueError('Invalid value to update "%s"' % o_update_field.s_dst_field)
-                        # Id field should be unique, so we stop searching for other romsets after the first match
-                        break
+            if isinstance(po_csv, (list, tuple)):
+                lo_csvs = po_csv
+            else:
+                lo_csvs = [po_csv]
 
-    def filter(self, o_filter):
-        """
-        Method to filter in/out games depending on a field name and allowed/disallowed values for that field.
+            dli_index = self._index_get(po_id_field.s_dst_field)
+
+            for o_csv in lo_csvs:
+                for lu_row in o_csv.llu_rows:
+                    u_csv_id = lu_row[po_id_field.i_src_column]
 
-        :param u_attribute: Name of the field to filter by. i.e. 'i_year'.
+                    # Id field should be unique, so only the first matching romset is updated
+                    li_positions = dli_index.get(u_csv_id)
+                    if not li_positions:
+                        o_output.lu_unmatched.append(u_csv_id)
+                        continue
 
-        :param lu_field_values: List of values we're using to filter. i.e. (1989, 1990, 1993) to filter by years
+                    o_output.lu_matched.append(u_csv_id)
+                    _csv_row_import(self.lo_games[li_positions[0]], lu_row, plo_fields, pb_overwrite)
 
-        :param u_method: 'in', 'out' to return the games the games that match the values of lu_field_values or the games
-                         that DON'T match the values of lu_field_values.
+            # Imported data modifies the fields of the romsets (even the description used to sort them), so the order
+            # and the indexes built for them are not valid anymore.
+            self._b_sorted = False
+            self._indexes_reset()
 
-        :return: A list of games that match or don't match your filter criteria.
+        return o_output
+
+    def filter(self, o_filter):
+        """
+        Method to filter in/out games depending on a filter (see Filter, FilterAnd, FilterOr and FilterNot classes).
+
+        :param o_filter: Filter object. i.e. Filter('i_year', 'equals', 1989, 1990, 1993) to filter by years.
+
+        :return: Two new RomSetContainer objects, one with the games that match your filter criteria and another one
+                 with the games that don't match it.
         """
 
         # Two RomSetContainer objects are created to store the games that matched the filter and the games that didn't
@@ -345,42 +743,64 @@ class RomSetContainer:
         o_unmatched_container = RomSetContainer()
         o_unmatched_container.copy_metadata_from(self)
 
-        for o_game in self:
-
-            # The first thing to do is (to try) to obtain o_game.<u_attribute>
-            try:
-                x_value = getattr(o_game, o_filter.u_attribute)
+        # Both containers start empty and _add_romset() keeps their indexes clean, but we reset them explicitly so a
+        # filtered container never shares an index with its parent.
+        o_matched_container._indexes_reset()
+        o_unmatched_container._indexes_reset()
 
-            except AttributeError:
-                raise Exception('ERROR: You are trying to access the unknown attribute "%s"' % o_filter.u_attribute)
+        self._sort()
+        lb_matches = _filter_apply(o_filter._compile(), self.lo_games)
 
-            # Then we can filter. Since we are filtering already unique games present in our container, we don't need
-            # to perform any uniqueness test while adding the games to the matched/unmatched containers. So, we use the
-            # method _add_romset which doesn't perform that test and is much faster than the equivalent one with test
+        for o_game, b_match in zip(self.lo_games, lb_matches):
+            # Since we are filtering already unique games present in our container, we don't need to perform any
+            # uniqueness test while adding the games to the matched/unmatched containers. So, we use the method
+            # _add_romset which doesn't perform that test and is much faster than the equivalent one with test
             # add_romset.
-            if o_filter.u_method == 'equals':
-                if x_value in o_filter.lx_values:
-                    o_matched_container._add_romset(o_game)
-
-                else:
-                    o_unmatched_container._add_romset(o_game)
+            if b_match:
+                o_matched_container._add_romset(o_game)
+            else:
+                o_unmatched_container._add_romset(o_game)
 
         return o_matched_container, o_unmatched_container
 
+    def query(self, po_filter):
+        """
+        Method to get the games matching a filter (see Filter, FilterAnd, FilterOr and FilterNot classes) without
+        copying them to new containers.
+
+        The filter is compiled into a single function evaluated in one pass, and when the filter (or part of it) is an
+        'equals'/'in' filter over a search field, the field indexes are used to evaluate only the candidate romsets.
+
+        :param po_filter: Filter object. i.e. FilterAnd(Filter('i_year', 'range', 1990, 1995),
+                                                         Filter('u_desc', 'regex', r'\(Europe\)'))
+
+        :return: A RomSetView object with the matched games.
+        """
+
+        px_match = po_filter._compile()
+        si_positions = po_filter._candidates(self)
+
+        # Candidates are taken from the sorted list, so the output is also sorted.
+        self._sort()
+
+        if si_positions is None:
+            lo_candidates = self.lo_games
+        else:
+            lo_candidates = [self.lo_games[i_position] for i_position in sorted(si_positions)]
+
+        lb_matches = _filter_apply(px_match, lo_candidates)
+        lo_romsets = [o_romset for o_romset, b_match in zip(lo_candidates, lb_matches) if b_match]
+
+        return RomSetView(self, lo_romsets)
+
     def id_exists(self, u_id):
         """
         Method to check if a id already exists in the database
-        :param u_id: id to check.
+        :param u_id: id to check (dirty MD5 of the romset).
         :return: True if the id already exists, False in other case.
         """
-        b_exists = False
-
-        for o_game in self.lo_games:
-            if o_game.u_id == u_id:
-                b_exists = True
-                break
 
-        return b_exists
+        return u_id in self._do_romsets_by_id
 
     # TODO: Probably this method can be deleted. It's also quite nasty since doesn't allow you to modify just one field.
     def modify_metadata(self, u_start=u'', u_end=u''):
@@ -417,8 +837,13 @@ class RomSetContainer:
         """
         Method to get a list of MULTIPLE GAMES with certain content in a field.
 
+        The search is performed using an index of the field that is built the first time the field is searched and
+        reused until the container is modified (see _indexes_reset()).
+
         :param pu_field: Name of the field. i.e. 'i_year'
 
+        :param pb_first: If True, only the first found romset will be returned.
+
         :param px_search_values: Content of the field to search for. i.e. 1985, 1986
 
         :return: A list with the found romsets.
@@ -430,195 +855,959 @@ class RomSetContainer:
             raise ValueError('Error: pu_field must be one of %s' % str(self._tu_valid_search_fields))
 
         else:
-            for o_romset in self:
-                if getattr(o_romset, pu_field) in px_search_values:
-                    lo_romsets.append(o_romset)
-                    if pb_first:
-                        break
+            dli_index = self._index_get(pu_field)
 
-        return lo_romsets
+            li_positions = []
+            for x_search_value in px_search_values:
+                li_positions.extend(dli_index.get(x_search_value, ()))
 
-    def read_from_dat(self, pu_file):
-        """
-        Method to load Dat data from a file on disk.
+            # The romsets are returned in the same order of the container, like a full scan would do.
+            if pb_first:
+                if li_positions:
+                    lo_romsets.append(self.lo_games[min(li_positions)])
+            else:
+                for i_position in sorted(set(li_positions)):
+                    lo_romsets.append(self.lo_games[i_position])
 
-        :param pu_file: File containing the data. i.e. '/home/john/mame.dat'
+        return lo_romsets
 
-        :return: Nothing.
+    def get_roms_by_field(self, pu_field, *px_search_values):
         """
+        Method to find individual roms (i.e. a single track of a CD game) with certain content in a field. The search is
+        performed using an index of the roms of all the romsets, like get_romsets_by_field() does.
 
-        # If the file is not present, we raise an error
-        if not os.path.isfile(pu_file):
-            raise ValueError('Can\'t find dat file "%s"' % pu_file)
+        :param pu_field: Name of the field. i.e. 'u_crc32', 'u_md5', 'u_sha1' or 'i_size'
 
-        o_file = codecs.open(pu_file, u'rb', u'utf8', u'ignore')
+        :param px_search_values: Content of the field to search for. i.e. 'a209fe80'
 
-        # We try to automatically identify it reading the beginning of the file.
-        u_first_line = o_file.readline()
-        o_file.close()
+        :return: A list of tuples (_RomSet, _Rom) in the order of the container.
+        """
 
-        # Identifying ClrMamePro mode
-        if (u_first_line.find(u'clrmamepro') != -1) or (u_first_line.find(u'emulator') != -1):
-            u_format = 'cmp'
+        if pu_field not in _ds_ROM_SEARCH_FIELDS:
+            raise ValueError('Error: pu_field must be one of %s' % str(sorted(_ds_ROM_SEARCH_FIELDS)))
 
-        # Identifying Xml mode
-        elif u_first_line.find(u'<?xml') != -1:
-            u_format = 'xml'
+        dli_index = self._rom_index_get(_ds_ROM_SEARCH_FIELDS[pu_field])
 
-        # Unknown format error raise
-        else:
-            raise IOError('Unknown DAT format')
+        li_positions = []
+        for x_search_value in px_search_values:
+            if pu_field != 'i_size':
+                x_search_value = _hex_to_hash(x_search_value)
+            x_positions = dli_index.get(x_search_value, ())
+            if isinstance(x_positions, (int, long)):
+                li_positions.append(x_positions)
+            else:
+                li_positions.extend(x_positions)
 
-        # Loading the file using the different readers depending on the format parameter
-        if u_format == 'cmp':
-            self._read_from_cmp(pu_file)
-        elif u_format == 'xml':
-            self._read_from_xml(pu_file)
+        ltoo_roms = []
+        for i_position in sorted(set(li_positions)):
+            o_romset = self.lo_games[i_position >> _i_ROM_POSITION_BITS]
+            ltoo_roms.append((o_romset, o_romset.lo_roms[i_position & _i_ROM_POSITION_MASK]))
 
-        # After loading the games from disk, the list is sorted
-        self._sort()
+        return ltoo_roms
 
-        # We alter the proper flag
-        self._db_flags['from_dat'] = True
+    def _index_get(self, pu_field):
+        """
+        Method to get the index of a field, building it if it doesn't exist yet.
 
-        # Now that the game container has been populated from disk, is the time to check that we don't have duplicated
-        # Ids
-        if self._duplicates_found():
-            print self._show_duplicates()
-            raise Exception('Duplicated Id\'s found')
+        :param pu_field: Name of the field. i.e. 'u_dmd5'
 
-    def _read_from_cmp(self, u_file):
-        """
-        Method to process ClrMamePro DATs.
+        :return: A dictionary {field value: [positions of the romsets in lo_games]}.
         """
-        self.u_type = u'ClrMamePro'
 
-        o_file = codecs.open(u_file, 'rb', 'utf8', 'ignore')
+        if pu_field not in self._ddli_indexes:
+            # Positions are only meaningful in the sorted list, so the container is sorted before building the index.
+            self._sort()
 
-        b_head_mode = False
-        b_game_mode = False
+            dli_index = {}
+            for i_position, o_romset in enumerate(self.lo_games):
+                dli_index.setdefault(getattr(o_romset, pu_field), []).append(i_position)
 
-        ls_head_strings = []    # List that will contain the multiple lines with data from the heading.
-        lu_game_strings = []    # List that will contain the multiple lines with data for a game.
+            self._ddli_indexes[pu_field] = dli_index
 
-        for u_line in o_file:
+        return self._ddli_indexes[pu_field]
 
-            # Detection of the start of the heading of the file
-            if (u_line.find(u'clrmamepro (') == 0) or (u_line.find('emulator (') == 0):
-                b_head_mode = True
-                continue
+    def _rom_index_get(self, ps_attribute):
+        """
+        Method to get the index of an attribute of the individual roms, building it if it doesn't exist yet. It's stored
+        with the romset indexes using the key 'rom:<attribute>'.
 
-            # If we are in "head-mode" and the first character of the line is ")", it means we have reached the end of
-            # the heading (so we have all its lines) and we can parse them.
-            if b_head_mode and u_line.find(')') == 0:
-                self.u_name = _dat_vertical_parse(ls_head_strings, 'name')
-                self.u_description = _dat_vertical_parse(ls_head_strings, 'description')
-                self.u_version = _dat_vertical_parse(ls_head_strings, 'version')
-                self.u_comment = _dat_vertical_parse(ls_head_strings, 'comment')
+        :param ps_attribute: Name of the _Rom attribute. i.e. 'i_crc32'
 
-                ls_head_strings = []
-                b_head_mode = False
-                continue
+        :return: A dictionary {attribute value: packed positions}. Each position contains the position of the romset
+                 in lo_games and the position of the rom inside it: (i_romset << _i_ROM_POSITION_BITS) | i_rom. To save
+                 memory (and loading time from the cache), unique values store the position as an integer instead of a
+                 list.
+        """
 
-            # If we are in "head-mode", we add the found lines to a list that will be parsed later" (look the code just
-            # above).
-            if b_head_mode:
-                ls_head_strings.append(u_line)
-                continue
+        s_key = 'rom:%s' % ps_attribute
 
-            # _RomSet data
-            if u_line.find('game (') == 0:
-                b_game_mode = True
-                continue
+        if s_key not in self._ddli_indexes:
+            self._sort()
 
-            if b_game_mode and u_line.find(')') == 0:
-                u_romset_name = _dat_vertical_parse(lu_game_strings, 'name')
-                u_romset_description = _dat_vertical_parse(lu_game_strings, 'description')
-                u_romset_author = _dat_vertical_parse(lu_game_strings, 'manufacturer')
-                u_game_year = _dat_vertical_parse(lu_game_strings, 'year')
-                if u_game_year == u'':
-                    u_game_year = u'0'
+            dx_index = {}
+            for i_romset, o_romset in enumerate(self.lo_games):
+                # Bigger positions would overflow into the bits of the romset position, returning wrong roms.
+                if len(o_romset.lo_roms) > _i_ROM_POSITION_MASK + 1:
+                    raise ValueError('Romset "%s" has %i roms, the rom indexes only support up to %i' %
+                                     (o_romset.u_name, len(o_romset.lo_roms), _i_ROM_POSITION_MASK + 1))
+
+                i_base = i_romset << _i_ROM_POSITION_BITS
+                for i_rom, o_rom in enumerate(o_romset.lo_roms):
+                    x_value = getattr(o_rom, ps_attribute)
+                    x_positions = dx_index.get(x_value)
+                    if x_positions is None:
+                        dx_index[x_value] = i_base | i_rom
+                    elif isinstance(x_positions, (int, long)):
+                        dx_index[x_value] = [x_positions, i_base | i_rom]
+                    else:
+                        x_positions.append(i_base | i_rom)
+
+            self._ddli_indexes[s_key] = dx_index
+
+        return self._ddli_indexes[s_key]
+
+    def _indexes_reset(self):
+        """
+        Method to discard all the field indexes. It MUST be called after any modification of the romsets stored in the
+        container (additions, deletions, imported data...).
 
-                lu_game_roms = _dat_vertical_parse(lu_game_strings, 'rom', 'multi')
+        :return: Nothing.
+        """
 
-                o_dat_romset = _RomSet(u_romset_name, u_romset_description)
-                o_dat_romset.i_year = int(u_game_year)
-                o_dat_romset.u_auth = u_romset_author
+        self._ddli_indexes = {}
 
-                for s_game_rom in lu_game_roms:
-                    # sometimes name has quotes " around and sometimes not, so it's safer to use size as end.
-                    u_rom_name = _dat_horizontal_parse(s_game_rom, 'name ', 'size')
+    def read_from_dat(self, pu_file, pb_cache=False, pu_cache_dir=None, pi_workers=1):
+        """
+        Method to load Dat data from a file on disk. The romsets are added to the ones already in the container.
 
-                    u_rom_size = _dat_horizontal_parse(s_game_rom, 'size ', ' ')
-                    u_rom_crc = _dat_horizontal_parse(s_game_rom, 'crc ', ' ')
-                    u_rom_md5 = _dat_horizontal_parse(s_game_rom, 'md5 ', ' ')
-                    u_rom_sha1 = _dat_horizontal_parse(s_game_rom, 'sha1 ', ' ')
+        :param pu_file: File containing the data. i.e. '/home/john/mame.dat'. It can be compressed (see dat_open()).
 
-                    # create a rom object
-                    o_rom = _Rom()
-                    o_rom.u_name = u_rom_name
-                    o_rom.i_size = int(u_rom_size)
-                    o_rom.u_crc32 = u_rom_crc.lower()
-                    o_rom.u_md5 = u_rom_md5.lower()
-                    o_rom.u_sha1 = u_rom_sha1.lower()
+        :param pb_cache: If True, a compiled cache of the DAT (see dat_cache_path()) will be used when it's up to date,
+                         and created or rebuilt when it doesn't exist or it's stale (only when the container was
+                         empty, so the cache contains just the romsets of the DAT).
 
-                    # add the rom object to the list
-                    o_dat_romset.lo_roms.append(o_rom)
+        :param pu_cache_dir: Directory for the cache file. If None, it will be created next to the DAT file.
+
+        :param pi_workers: Number of processes used to parse ClrMamePro DATs (see _read_from_cmp_parallel()). XML and
+                           compressed DATs are always parsed by a single process.
+
+        :return: Nothing.
+        """
+
+        # If the file is not present, we raise an error
+        if not os.path.isfile(pu_file):
+            raise ValueError('Can\'t find dat file "%s"' % pu_file)
+
+        # Romsets are added to the ones already in the container, but the cache must contain just the ones of the DAT.
+        b_cache_save = pb_cache and not self.i_games
+
+        if pb_cache and self._dat_cache_load(pu_file, pu_cache_dir):
+            b_cache_save = False
+        else:
+            self._dat_parse(pu_file, pi_workers)
+
+        # After loading the games from disk, the list is sorted
+        self._sort()
+
+        # We alter the proper flag
+        self._db_flags['from_dat'] = True
+
+        # Now that the game container has been populated from disk, is the time to check that we don't have duplicated
+        # Ids
+        if self._duplicates_found():
+            print self._show_duplicates()
+            raise Exception('Duplicated Id\'s found')
+
+        if b_cache_save:
+            self._dat_cache_save(pu_file, pu_cache_dir)
+
+    def _dat_parse(self, pu_file, pi_workers=1):
+        """
+        Method to parse a DAT file, identifying its format, and add its romsets to the container. Romsets are not sorted
+        nor checked for duplicated ids, see read_from_dat().
+
+        :param pu_file: DAT file. i.e. '/home/john/mame.dat'
+
+        :param pi_workers: Number of processes used to parse ClrMamePro DATs. See read_from_dat().
+
+        :return: Nothing.
+        """
+
+        # We try to automatically identify it reading the beginning of the file (uncompressed when needed).
+        o_file = dat_open(pu_file)
+        u_first_line = o_file.readline().decode('utf8', 'ignore')
+        o_file.close()
+
+        # Identifying ClrMamePro mode
+        if (u_first_line.find(u'clrmamepro') != -1) or (u_first_line.find(u'emulator') != -1):
+            u_format = 'cmp'
+
+        # Identifying Xml mode
+        elif u_first_line.find(u'<?xml') != -1:
+            u_format = 'xml'
+
+        # Unknown format error raise
+        else:
+            raise IOError('Unknown DAT format')
+
+        # Loading the file using the different readers depending on the format parameter
+        # Compressed DATs can't be split in chunks without uncompressing them, so they are always read as a stream.
+        if u_format == 'cmp' and pi_workers > 1 and not dat_compression(pu_file):
+            self._read_from_cmp_parallel(pu_file, pi_workers)
+        elif u_format == 'cmp':
+            self._read_from_cmp(pu_file)
+        elif u_format == 'xml':
+            self._read_from_xml(pu_file)
+
+    def _dat_cache_load(self, pu_file, pu_cache_dir=None):
+        """
+        Method to populate the container from the compiled cache of a DAT file.
+
+        :param pu_file: DAT file. i.e. '/home/john/snes.dat'
+
+        :param pu_cache_dir: Directory of the cache file. If None, the cache is searched next to the DAT file.
+
+        :return: True if the cache was up to date and it was loaded, False in other case.
+        """
+
+        b_loaded = False
+
+        try:
+            o_file = open(dat_cache_path(pu_file, pu_cache_dir), 'rb')
+            try:
+                tx_fingerprint = marshal.load(o_file)
+                if tx_fingerprint == _dat_fingerprint(pu_file):
+                    self._unserialize(marshal.load(o_file))
+                    b_loaded = True
+            finally:
+                o_file.close()
+
+        # A missing or corrupted cache is not an error, the DAT will be parsed again and the cache rebuilt.
+        except (IOError, OSError, EOFError, ValueError, TypeError, KeyError, IndexError):
+            pass
+
+        return b_loaded
+
+    def _dat_cache_save(self, pu_file, pu_cache_dir=None):
+        """
+        Method to write the compiled cache of the DAT file the container was read from. The cache contains the metadata
+        and the sorted romsets of the container (including their compound hashes), the field indexes already built and
+        the indexes of the individual roms (see get_roms_by_field()).
+
+        The data is stored as plain python types using marshal, which is several times faster to load than pickled
+        objects.
+
+        :param pu_file: DAT file. i.e. '/home/john/snes.dat'
+
+        :param pu_cache_dir: Directory of the cache file. If None, the cache is created next to the DAT file.
+
+        :return: True if the cache was written, False in other case (i.e. read-only directory).
+        """
+
+        # Individual rom indexes are always stored, so single files can be identified without scanning the romsets.
+        for s_attribute in _ds_ROM_SEARCH_FIELDS.itervalues():
+            self._rom_index_get(s_attribute)
+
+        tx_data = self._serialize()
+
+        u_cache_file = dat_cache_path(pu_file, pu_cache_dir)
+        u_tmp_file = u'%s.%i.tmp' % (u_cache_file, os.getpid())
+
+        b_saved = False
+
+        try:
+            o_file = open(u_tmp_file, 'wb')
+            try:
+                # The fingerprint is stored first so stale caches can be detected without loading the whole data.
+                marshal.dump(_dat_fingerprint(pu_file), o_file)
+                marshal.dump(tx_data, o_file)
+            finally:
+                o_file.close()
+
+            # The cache is renamed at the end, so other processes will never read a half-written file.
+            os.rename(u_tmp_file, u_cache_file)
+            b_saved = True
+
+        except (IOError, OSError):
+            if os.path.isfile(u_tmp_file):
+                os.remove(u_tmp_file)
+
+        return b_saved
+
+    def _read_from_cmp(self, u_file):
+        """
+        Method to process ClrMamePro DATs.
+        """
+        o_file = dat_open(u_file)
+        self._parse_cmp_lines(codecs.getreader('utf8')(o_file, 'ignore'))
+        o_file.close()
+
+    def _read_from_cmp_parallel(self, u_file, pi_workers):
+        """
+        Method to process big ClrMamePro DATs using several processes. The file is split in chunks at the beginning of
+        romset blocks (see _cmp_chunk_offsets()), each chunk is parsed by a worker, and the romsets are added to the
+        container in the original order of the file, so the result is the same than using _read_from_cmp().
+
+        :param u_file: DAT file. i.e. '/home/john/mame.dat'
+
+        :param pi_workers: Number of worker processes.
 
-                # We add the game to the container without any kind of check, we will do it later.
-                self._add_romset(o_dat_romset)
+        :return: Nothing.
+        """
+        self.u_type = u'ClrMamePro'
+
+        li_offsets = _cmp_chunk_offsets(u_file, pi_workers * _i_CMP_CHUNKS_PER_WORKER)
+        ltx_jobs = [(u_file, i_start, i_end) for i_start, i_end in zip(li_offsets[:-1], li_offsets[1:])]
+
+        o_pool = multiprocessing.Pool(processes=pi_workers)
+        try:
+            # imap returns the chunks in order, so romsets are added while the workers keep parsing the next chunks.
+            for s_data in o_pool.imap(_cmp_chunk_parse, ltx_jobs, chunksize=1):
+                tu_heading, ltx_romsets = marshal.loads(s_data)
+
+                if tu_heading is not None:
+                    self.u_name, self.u_description, self.u_version, self.u_comment = tu_heading
+
+                self._romsets_register([_romset_unserialize(tx_romset) for tx_romset in ltx_romsets])
+
+        except BaseException:
+            # The rest of chunks are not needed anymore, so the workers are stopped instead of waiting for them.
+            o_pool.terminate()
+            o_pool.join()
+            raise
+
+        o_pool.close()
+        o_pool.join()
+
+    def _parse_cmp_lines(self, pu_lines):
+        """
+        Method to parse the lines of a ClrMamePro DAT in a single pass. Each line is read just once and the _RomSet and
+        _Rom objects are built as soon as their data is complete.
+
+        The structure of a ClrMamePro DAT is a list of blocks like:
 
-                lu_game_strings = []
-                b_game_mode = False
+            clrmamepro (
+                name "Nintendo - Super Nintendo Entertainment System"
+                ...
+            )
+
+            game (
+                name "Super Mario World (Europe)"
+                description "Super Mario World (Europe)"
+                rom ( name "Super Mario World (Europe).sfc" size 524288 crc ... md5 ... sha1 ... )
+            )
+
+        :param pu_lines: Iterable of unicode lines. i.e. an opened file.
+
+        :return: Nothing.
+        """
+        self.u_type = u'ClrMamePro'
+
+        u_block = None          # Kind of block being parsed: None (outside any block), 'head', 'game' or 'skip'.
+        i_sub_depth = 0         # Depth of multi-line sub-blocks inside the current block (they are ignored).
+        du_fields = {}          # Fields of the current block. i.e. {'name': 'Super Mario World (Europe)', ...}
+        lo_roms = []            # Roms of the current block.
+        lo_romsets = []         # Parsed romsets. They are added to the container in batches (see _i_PARSE_BATCH).
+
+        for u_line in pu_lines:
+            u_line = u_line.strip()
+
+            if not u_line:
                 continue
 
-            # _RomSet mode actions
-            if b_game_mode:
-                lu_game_strings.append(u_line)
-                pass
+            # Outside blocks, the only thing we can find is the beginning of a new one. i.e. 'game ('
+            if u_block is None:
+                u_key, u_sep, u_value = u_line.partition(u' ')
+                if u_value.strip() == u'(':
+                    if u_key in _tu_CMP_HEAD_BLOCKS:
+                        u_block = 'head'
+                    elif u_key in _tu_CMP_GAME_BLOCKS:
+                        u_block = 'game'
+                    else:
+                        u_block = 'skip'
+                continue
+
+            if u_line == u')':
+                if i_sub_depth:
+                    i_sub_depth -= 1
+                    continue
+
+                if u_block == 'head':
+                    self.u_name = du_fields.get(u'name', u'')
+                    self.u_description = du_fields.get(u'description', u'')
+                    self.u_version = du_fields.get(u'version', u'')
+                    self.u_comment = du_fields.get(u'comment', u'')
+
+                elif u_block == 'game':
+                    o_dat_romset = _RomSet(du_fields.get(u'name', u''), du_fields.get(u'description', u''))
+                    o_dat_romset.u_auth = du_fields.get(u'manufacturer', u'')
+                    try:
+                        o_dat_romset.i_year = int(du_fields.get(u'year', u'0'))
+                    except ValueError:
+                        o_dat_romset.i_year = 0
+                    o_dat_romset.lo_roms = lo_roms
+
+                    lo_romsets.append(o_dat_romset)
+                    if len(lo_romsets) >= _i_PARSE_BATCH:
+                        self._romsets_register(lo_romsets)
+                        lo_romsets = []
+
+                u_block = None
+                du_fields = {}
+                lo_roms = []
+                continue
+
+            if u_block == 'skip' or i_sub_depth:
+                if u_line.endswith(u'('):
+                    i_sub_depth += 1
+                continue
+
+            u_key, u_sep, u_value = u_line.partition(u' ')
+            u_value = u_value.strip()
+
+            if u_key == u'rom':
+                lo_roms.append(_cmp_rom_parse(u_value))
+
+            elif u_value == u'(':
+                i_sub_depth += 1
+
+            else:
+                du_fields[u_key] = u_value.strip(u'"')
+
+        self._romsets_register(lo_romsets)
 
     def _read_from_xml(self, u_file):
+        """
+        Method to process XML DATs (Logiqx, No-Intro...).
+
+        The file is read as a stream and each game element is discarded as soon as it's converted to a _RomSet, so the
+        whole XML tree is never kept in memory.
+        """
         self.u_type = u'XML'
 
-        o_xml_tree = xml.etree.cElementTree.parse(u_file)
-        o_xml_root = o_xml_tree.getroot()
+        o_xml_root = None
+        lo_romsets = []
+
+        o_file = dat_open(u_file)
+
+        for s_event, o_xml_elem in xml.etree.cElementTree.iterparse(o_file, events=('start', 'end')):
+            # The first element found is the root. We keep it to remove the already processed elements from it.
+            if o_xml_root is None:
+                o_xml_root = o_xml_elem
+
+            if s_event != 'end':
+                continue
+
+            # Header information
+            if o_xml_elem.tag == 'header':
+                self.u_name = o_xml_elem.findtext('name', u'')
+                self.u_description = o_xml_elem.findtext('description', u'')
+                self.u_version = o_xml_elem.findtext('version', u'')
+                self.u_author = o_xml_elem.findtext('author', u'')
+
+                o_xml_root.clear()
+
+            # _RomSet information
+            elif o_xml_elem.tag in _tu_XML_GAME_TAGS:
+                u_game_name = o_xml_elem.attrib['name']
+                u_game_description = u_game_name
+
+                o_dat_game = _RomSet(u_game_name, u_game_description)
+
+                lo_roms = []
+                for o_rom_elem in o_xml_elem.iterfind('rom'):
+                    # create a rom object
+                    o_rom = _Rom()
+                    o_rom.u_name = o_rom_elem.attrib['name']
+                    o_rom.i_size = int(o_rom_elem.attrib.get('size', 0))
+
+                    # MAME roms don't include md5, and bad dumps (status="nodump") don't include any hash at all.
+                    o_rom.i_crc32 = _hex_to_hash(o_rom_elem.attrib.get('crc'))
+                    o_rom.i_md5 = _hex_to_hash(o_rom_elem.attrib.get('md5'))
+                    o_rom.i_sha1 = _hex_to_hash(o_rom_elem.attrib.get('sha1'))
+
+                    # add the rom object to the list
+                    lo_roms.append(o_rom)
+
+                o_dat_game.lo_roms = lo_roms
 
-        # Header information
-        o_header = o_xml_root.find('header')
-        self.u_name = o_header.find('name').text
-        self.u_description = o_header.find('description').text
-        self.u_version = o_header.find('version').text
-        self.u_author = o_header.find('author').text
+                lo_romsets.append(o_dat_game)
+                if len(lo_romsets) >= _i_PARSE_BATCH:
+                    self._romsets_register(lo_romsets)
+                    lo_romsets = []
+
+                # The game element (and any other element already processed) is not needed anymore.
+                o_xml_root.clear()
+
+        o_file.close()
+
+        self._romsets_register(lo_romsets)
+
+    def _romsets_register(self, plo_romsets):
+        """
+        Method to add the romsets read from a DAT to the container. Their compound hashes are computed in a single batch
+        before (see caches_build()), so they are not computed one by one when the ids are registered. Parsers call it
+        for every batch of romsets (see _i_PARSE_BATCH), so containers not keeping the romsets in memory (see
+        roms_db.SqliteRomSetContainer) never get the whole DAT at once.
 
-        # _RomSet information
-        for o_game_elem in o_xml_root.findall('game'):
-            u_game_name = o_game_elem.attrib['name']
-            u_game_description = u_game_name
+        :param plo_romsets: List of _RomSet objects.
 
-            o_dat_game = _RomSet(u_game_name, u_game_description)
+        :return: Nothing.
+        """
+
+        caches_build(plo_romsets)
+
+        # We add the games to the container without any kind of check, we will do it later.
+        for o_romset in plo_romsets:
+            self._add_romset(o_romset)
+
+    def _serialize(self):
+        """
+        Method to get the whole data of the container as plain python types (so it can be stored with marshal or sent
+        between processes very fast). The romsets are sorted and their compound hashes computed before.
+
+        :return: A tuple (metadata dictionary, list of serialized romsets, field indexes).
+        """
+
+        self._sort()
+        self.cache_build()
 
-            for o_rom_elem in o_game_elem.findall('rom'):
-                # create a rom object
-                o_rom = _Rom()
-                o_rom.u_name = o_rom_elem.attrib['name']
-                o_rom.i_size = int(o_rom_elem.attrib['size'])
-                o_rom.u_crc32 = o_rom_elem.attrib['crc'].lower()
-                o_rom.u_md5 = o_rom_elem.attrib['md5'].lower()
-                o_rom.u_sha1 = o_rom_elem.attrib['sha1'].lower()
+        dx_metadata = {}
+        for u_key in (u'u_name', u'u_description', u'u_version', u'u_comment', u'u_type', u'u_author', u'_db_flags'):
+            dx_metadata[u_key] = getattr(self, u_key)
 
-                # add the rom object to the list
-                o_dat_game.lo_roms.append(o_rom)
+        ltx_romsets = [o_romset.serialize() for o_romset in self.lo_games]
 
-            # We add the game to the container without any kind of check, we will do it later.
-            self._add_romset(o_dat_game)
+        return dx_metadata, ltx_romsets, self._ddli_indexes
+
+    def _unserialize(self, ptx_data):
+        """
+        Method to add the data generated by _serialize() to the container. Like parsing a DAT, the romsets are added to
+        the previous ones and the metadata is replaced (but the flags of a container with romsets are kept).
+
+        :param ptx_data: Tuple of data.
+
+        :return: Nothing.
+        """
+
+        dx_metadata, ltx_romsets, ddli_indexes = ptx_data
+
+        # Romsets are rebuilt before modifying the container, so it's not modified when the data is wrong.
+        lo_romsets = [_romset_unserialize(tx_romset) for tx_romset in ltx_romsets]
+
+        b_empty = not self.i_games
+
+        for u_key, x_value in dx_metadata.iteritems():
+            if b_empty or u_key != u'_db_flags':
+                setattr(self, u_key, x_value)
+
+        self._romsets_register(lo_romsets)
+
+        # The romsets were serialized already sorted, so the serialized indexes are valid when there were no others.
+        if b_empty:
+            self._b_sorted = True
+            self._ddli_indexes = ddli_indexes
 
     def _sort(self):
+        """
+        Method to sort the list of games if it was modified since the last time it was sorted.
+
+        :return: Nothing.
+        """
+
         # Sorting of the list based on the game description (which is more reliable than the short name of the game)
-        self.lo_games.sort(key=lambda o_game: o_game.u_desc.encode('utf8', 'strict'), reverse=False)
+        if not self._b_sorted:
+            self.lo_games.sort(key=operator.attrgetter('s_sort_key'))
+            self._b_sorted = True
+
+
+class RomSetView:
+    """
+    Class to store the result of RomSetContainer.query(). It's a lightweight read-only view of the games of a container,
+    they are not copied.
+    """
+
+    def __init__(self, po_container, plo_games):
+        self.o_container = po_container     # RomSetContainer the games belong to
+        self.lo_games = plo_games           # List of matched games, in the same order of the container
+
+    def __iter__(self):
+        return iter(self.lo_games)
+
+    def __len__(self):
+        return len(self.lo_games)
+
+    def _get_num_games(self):
+        return len(self.lo_games)
+
+    i_games = property(fget=_get_num_games)
+
+    def query(self, po_filter):
+        """
+        Method to refine the view with another filter.
+
+        :param po_filter: Filter object.
+
+        :return: A new RomSetView object.
+        """
+
+        lb_matches = _filter_apply(po_filter._compile(), self.lo_games)
+        lo_romsets = [o_romset for o_romset, b_match in zip(self.lo_games, lb_matches) if b_match]
+
+        return RomSetView(self.o_container, lo_romsets)
+
+    def to_container(self):
+        """
+        Method to copy the games of the view to a new RomSetContainer with the metadata of the original one.
+
+        :return: A RomSetContainer object.
+        """
+
+        o_container = RomSetContainer()
+        o_container.copy_metadata_from(self.o_container)
+        o_container.modify_metadata(u'FILTER(', u')')
+        o_container.add_romsets(self.lo_games)
+
+        return o_container
+
+
+class LazyRomSetContainer:
+    """
+    Class to access the romsets of a ClrMamePro DAT without building all of them. A compact index with the byte offsets
+    of the romsets in the DAT file and the values of their names, descriptions and compound hashes is built (and stored
+    in a cache file, see dat_cache_path()), then each romset is parsed from a memory map of the DAT only when it's
+    accessed. It's useful when just a few romsets of a big DAT are needed.
+
+    The romsets are in the same order than in a RomSetContainer read from the same DAT. Use to_container() when the
+    full RomSetContainer functionality (filters, csv import/export...) is needed.
+    """
+
+    def __init__(self, u_file, pb_cache=True, pu_cache_dir=None):
+        self.u_file = u_file      # DAT file the romsets are read from
+
+        self.u_name = u''         # internal name of the dat file.
+        self.u_description = u''  # description of the dat file.
+        self.u_version = u''      # version of the dat file (usually a date).
+        self.u_comment = u''      # extra comment for the dat file.
+        self.u_type = u''         # type of DAT file the data comes from.
+        self.u_author = u''       # Author of the dat.
+
+        self._li_starts = []      # start and end offsets of each romset in the DAT file, in the sorted order of
+        self._li_ends = []        # RomSetContainer.
+
+        # Indexes for get_romsets_by_field(). Each key is a field from _tu_LAZY_INDEX_FIELDS and each value is a
+        # dictionary {field value: position of the romset}. To save memory, hashes are stored as integers and the
+        # position is just an integer instead of a list when there is only one romset with that value.
+        self._ddli_indexes = {}
+
+        self._do_romsets = {}     # romsets already built, by position
+
+        if not os.path.isfile(u_file):
+            raise ValueError('Can\'t find dat file "%s"' % u_file)
+
+        if not (pb_cache and self._index_load(pu_cache_dir)):
+            self._index_build()
+            if pb_cache:
+                self._index_save(pu_cache_dir)
+
+        o_file = open(u_file, 'rb')
+        self._o_mmap = mmap.mmap(o_file.fileno(), 0, access=mmap.ACCESS_READ)
+        o_file.close()
+
+    def __iter__(self):
+        for i_position in range(len(self._li_starts)):
+            yield self._romset_get(i_position)
+
+    def __len__(self):
+        return len(self._li_starts)
+
+    def _get_num_games(self):
+        return len(self._li_starts)
+
+    i_games = property(fget=_get_num_games)
+
+    def close(self):
+        """
+        Method to release the memory map of the DAT file. Romsets already built can still be used.
+
+        :return: Nothing.
+        """
+
+        self._o_mmap.close()
+
+    def get_romsets_by_field(self, pu_field, pb_first, *px_search_values):
+        """
+        Method to get a list of games with certain content in a field. Same as RomSetContainer.get_romsets_by_field()
+        but only the fields in _tu_LAZY_INDEX_FIELDS can be searched.
+
+        :param pu_field: Name of the field. i.e. 'u_dmd5'
+
+        :param pb_first: If True, only the first found romset will be returned.
+
+        :param px_search_values: Content of the field to search for. i.e. u'0a1b2c3d...'
+
+        :return: A list with the found romsets.
+        """
+
+        if pu_field not in _tu_LAZY_INDEX_FIELDS:
+            raise ValueError('Error: pu_field must be one of %s' % str(_tu_LAZY_INDEX_FIELDS))
+
+        li_positions = []
+        for x_search_value in px_search_values:
+            x_positions = self._ddli_indexes[pu_field].get(_lazy_index_key(pu_field, x_search_value), ())
+            if isinstance(x_positions, (int, long)):
+                li_positions.append(x_positions)
+            else:
+                li_positions.extend(x_positions)
+
+        if pb_first:
+            li_positions = sorted(li_positions)[:1]
+        else:
+            li_positions = sorted(set(li_positions))
+
+        return [self._romset_get(i_position) for i_position in li_positions]
+
+    def id_exists(self, u_id):
+        """
+        Method to check if a romset id (dirty MD5) is present in the DAT.
+
+        :param u_id: Id to check. i.e. '0a1b2c3d...'
+
+        :return: True if the id exists, False in other case.
+        """
+
+        return _lazy_index_key('u_dmd5', u_id) in self._ddli_indexes['u_dmd5']
+
+    def to_container(self):
+        """
+        Method to build all the romsets and copy them to a new RomSetContainer.
+
+        :return: A RomSetContainer object.
+        """
+
+        o_container = RomSetContainer()
+        for u_key in (u'u_name', u'u_description', u'u_version', u'u_comment', u'u_type', u'u_author'):
+            setattr(o_container, u_key, getattr(self, u_key))
+        o_container._db_flags['from_dat'] = True
+        o_container.add_romsets(list(self))
+
+        return o_container
+
+    def _romset_get(self, pi_position):
+        """
+        Method to get a romset, parsing it from the DAT file the first time it's accessed.
+
+        :param pi_position: Position of the romset.
+
+        :return: A _RomSet object.
+        """
+
+        o_romset = self._do_romsets.get(pi_position)
+
+        if o_romset is None:
+            s_data = self._o_mmap[self._li_starts[pi_position]:self._li_ends[pi_position]]
+
+            o_parser = RomSetContainer()
+            o_parser._parse_cmp_lines(s_data.decode('utf8', 'ignore').splitlines())
+
+            o_romset = o_parser.lo_games[0]
+            self._do_romsets[pi_position] = o_romset
+
+        return o_romset
+
+    def _index_build(self):
+        """
+        Method to build the offset index reading the whole DAT file once. The romsets are built just to get the values
+        of the indexed fields and they are discarded immediately.
+
+        :return: Nothing.
+        """
+
+        if dat_compression(self.u_file):
+            raise IOError('Lazy containers can\'t read compressed DATs')
+
+        o_file = open(self.u_file, 'rb')
+
+        u_first_line = o_file.readline().decode('utf8', 'ignore')
+        if (u_first_line.find(u'clrmamepro') == -1) and (u_first_line.find(u'emulator') == -1):
+            o_file.close()
+            raise IOError('Lazy containers only support ClrMamePro DATs')
+        o_file.seek(0)
+
+        o_parser = RomSetContainer()
+
+        li_starts = []
+        li_ends = []
+        ltx_values = []
+        ls_sort_keys = []
+
+        i_offset = 0
+        i_block_start = 0
+        lu_block_lines = []
+
+        # Each chunk of lines from a romset start line to the next one contains a single romset. The lines before the
+        # first romset contain the heading of the DAT.
+        for s_line in o_file:
+            if _o_CMP_GAME_START_RE.match(s_line):
+                self._index_block_add(o_parser, lu_block_lines, i_block_start, i_offset, li_starts, li_ends,
+                                      ltx_values, ls_sort_keys)
+                i_block_start = i_offset
+                lu_block_lines = []
+
+            lu_block_lines.append(s_line.decode('utf8', 'ignore'))
+            i_offset += len(s_line)
+
+        self._index_block_add(o_parser, lu_block_lines, i_block_start, i_offset, li_starts, li_ends, ltx_values,
+                              ls_sort_keys)
+
+        o_file.close()
+
+        # Same (stable) order than RomSetContainer._sort()
+        li_order = sorted(range(len(li_starts)), key=ls_sort_keys.__getitem__)
+
+        self._li_starts = [li_starts[i_game] for i_game in li_order]
+        self._li_ends = [li_ends[i_game] for i_game in li_order]
+
+        self._ddli_indexes = {}
+        for i_field, s_field in enumerate(_tu_LAZY_INDEX_FIELDS):
+            dx_index = {}
+            for i_position, i_game in enumerate(li_order):
+                x_key = ltx_values[i_game][i_field]
+                x_positions = dx_index.get(x_key)
+                if x_positions is None:
+                    dx_index[x_key] = i_position
+                elif isinstance(x_positions, (int, long)):
+                    dx_index[x_key] = [x_positions, i_position]
+                else:
+                    x_positions.append(i_position)
+            self._ddli_indexes[s_field] = dx_index
+
+        # Same duplicated ids check than RomSetContainer.read_from_dat()
+        dsu_duplicates = {}
+        for i_dmd5, li_positions in self._ddli_indexes['u_dmd5'].iteritems():
+            if not isinstance(li_positions, (int, long)):
+                dsu_duplicates[_hash_to_hex(i_dmd5, 32)] = set([ltx_values[li_order[i_position]][0]
+                                                                 for i_position in li_positions])
+        if dsu_duplicates:
+            print dsu_duplicates
+            raise Exception('Duplicated Id\'s found')
+
+    def _index_block_add(self, po_parser, plu_lines, pi_start, pi_end, pli_starts, pli_ends, pltx_values,
+                         pls_sort_keys):
+        """
+        Method to parse a chunk of lines of the DAT and add its romset (if any) to the lists used to build the index.
+        The heading of the DAT is taken from the first chunk.
+
+        :param po_parser: RomSetContainer used to parse the lines. It's emptied after parsing them.
+
+        :param plu_lines: List of unicode lines.
+
+        :param pi_start: Offset of the first line in the DAT file.
+
+        :param pi_end: Offset of the end of the last line in the DAT file.
+
+        :param pli_starts: List of start offsets of the romsets.
+
+        :param pli_ends: List of end offsets of the romsets.
+
+        :param pltx_values: List of tuples with the index keys of each romset (see _tu_LAZY_INDEX_FIELDS).
+
+        :param pls_sort_keys: List of sort keys of the romsets.
+
+        :return: Nothing.
+        """
+
+        po_parser._parse_cmp_lines(plu_lines)
+
+        if pi_start == 0:
+            for u_key in (u'u_name', u'u_description', u'u_version', u'u_comment', u'u_type'):
+                setattr(self, u_key, getattr(po_parser, u_key))
+
+        if po_parser.lo_games:
+            o_romset = po_parser.lo_games[0]
+            pli_starts.append(pi_start)
+            pli_ends.append(pi_end)
+            pltx_values.append(tuple([_lazy_index_key(s_field, getattr(o_romset, s_field))
+                                      for s_field in _tu_LAZY_INDEX_FIELDS]))
+            pls_sort_keys.append(o_romset.s_sort_key)
+
+        po_parser.empty()
+
+    def _index_load(self, pu_cache_dir=None):
+        """
+        Method to load the offset index from its cache file.
+
+        :param pu_cache_dir: Directory of the cache file. If None, the cache is searched next to the DAT file.
+
+        :return: True if the index was up to date and it was loaded, False in other case.
+        """
+
+        b_loaded = False
+
+        try:
+            o_file = open(dat_cache_path(self.u_file, pu_cache_dir, u_DAT_INDEX_EXT), 'rb')
+            try:
+                if marshal.load(o_file) == _dat_fingerprint(self.u_file):
+                    dx_metadata, li_starts, li_ends, ddli_indexes = marshal.load(o_file)
+                    b_loaded = True
+            finally:
+                o_file.close()
+
+        # A missing or corrupted index is not an error, it will be built again.
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            pass
+
+        if b_loaded:
+            for u_key, x_value in dx_metadata.iteritems():
+                setattr(self, u_key, x_value)
+            self._li_starts = li_starts
+            self._li_ends = li_ends
+            self._ddli_indexes = ddli_indexes
+
+        return b_loaded
+
+    def _index_save(self, pu_cache_dir=None):
+        """
+        Method to write the offset index to its cache file.
+
+        :param pu_cache_dir: Directory of the cache file. If None, it's created next to the DAT file.
+
+        :return: True if the index was written, False in other case (i.e. read-only directory).
+        """
+
+        dx_metadata = {}
+        for u_key in (u'u_name', u'u_description', u'u_version', u'u_comment', u'u_type', u'u_author'):
+            dx_metadata[u_key] = getattr(self, u_key)
+
+        u_cache_file = dat_cache_path(self.u_file, pu_cache_dir, u_DAT_INDEX_EXT)
+        u_tmp_file = u'%s.%i.tmp' % (u_cache_file, os.getpid())
+
+        b_saved = False
+
+        try:
+            o_file = open(u_tmp_file, 'wb')
+            try:
+                marshal.dump(_dat_fingerprint(self.u_file), o_file)
+                marshal.dump((dx_metadata, self._li_starts, self._li_ends, self._ddli_indexes), o_file)
+            finally:
+                o_file.close()
+
+            os.rename(u_tmp_file, u_cache_file)
+            b_saved = True
+
+        except (IOError, OSError):
+            if os.path.isfile(u_tmp_file):
+                os.remove(u_tmp_file)
+
+        return b_saved
 
 
 class _RomSet(object):
 
+    # Big DATs contain tens of thousands of romsets, so __slots__ is used to save memory.
+    __slots__ = ('u_name', '_u_desc', 's_sort_key', 'i_year', 'u_auth', '_tx_cache', '_lo_roms',
+                 '_lu_languages', '_lu_countries', '_lu_genres')
+
     def __init__(self, pu_name, pu_description):
 
         # Properties: Basic ones
@@ -627,6 +1816,7 @@ class _RomSet(object):
 
         # Properties: The rest
         self.i_year = 0              # Year the game was published in (MAME dat support only, AFAIK).
+        self._tx_cache = None        # Cache of compound hashes and sizes. See cache_build().
         self.lo_roms = []            # List containing all the ROM information objects.
         self.u_auth = u''            # Author, company that programmed the game (MAME dat support only, AFAIK).
 
@@ -635,6 +1825,16 @@ class _RomSet(object):
         self._lu_countries = []      # List of iso codes (3 letters) for countries where the game was published
         self._lu_genres = []         # List of genres
 
+    def __getstate__(self):
+        # lo_roms is stored as a plain list because _RomList keeps a reference to its owner _RomSet.
+        return (self.u_name, self.u_desc, self.i_year, self.u_auth, self._tx_cache, list(self._lo_roms),
+                self._lu_languages, self._lu_countries, self._lu_genres)
+
+    def __setstate__(self, ptx_state):
+        (self.u_name, self.u_desc, self.i_year, self.u_auth, self._tx_cache, lo_roms,
+         self._lu_languages, self._lu_countries, self._lu_genres) = ptx_state
+        self._lo_roms = _RomList(self, lo_roms)
+
     def __str__(self):
         u_output = u''
         u_output += u'[_RomSet]\n'
@@ -688,135 +1888,143 @@ class _RomSet(object):
 
             1. Different hashing methods are used: crc32, md5, sha1
 
-            #TODO: Explain pb_clean parameter
+            #TODO: Explain pb_clean parameter
+
+            2. Only *relevant* ROMs are considered. For example, meta-data information is typically included in the form
+               of .cue files for optical disc images. That information is not really included in the original media and
+               its content would modify the hash result of the real data. Imagine two .cue files containing:
+
+                   Track 1: Street Fighter.bin
+
+                   Track 1: Street fighter.bin
+
+               Although the content of the .bin file is the same, the .cue files are different (notice the
+               capital-lowercase initial of "fighter"). In consequence, the hash of the .cue file is different and the
+               global hash of the whole game will be different. SO, TO AVOID THIS ISSUE, .CUE FILES AND OTHER META-DATA
+               FILES ARE NOT CONSIDERED WHEN CALCULATING THE HASH OF THE GAME.
+
+        The hashes are computed just once (see cache_build()) and kept until lo_roms is modified.
+
+        :return: The compound hash in hex-string format. i.e. '01020304'
+        """
+
+        if pu_type not in ('crc32', 'md5', 'sha1'):
+            raise Exception('Invalid pu_type "%s"' % pu_type)
+
+        if pb_clean:
+            u_key = u'c%s' % pu_type
+        else:
+            u_key = u'd%s' % pu_type
+
+        return self._get_cache()[_di_CACHE_POSITIONS[u_key]]
+
+    def _get_size(self, pb_clean=False):
+        """
+        Method to get the size of a romset taking into account all the files (dirty mode) or just relevant files (clean
+        mode).
+
+        :param pb_clean: True for clean mode, False for dirty mode
+        """
+
+        if pb_clean:
+            u_key = u'csize'
+        else:
+            u_key = u'dsize'
+
+        return self._get_cache()[_di_CACHE_POSITIONS[u_key]]
 
-            2. Only *relevant* ROMs are considered. For example, meta-data information is typically included in the form
-               of .cue files for optical disc images. That information is not really included in the original media and
-               its content would modify the hash result of the real data. Imagine two .cue files containing:
+    def _get_cache(self):
+        """
+        Method to get the cache of compound hashes and sizes, building it when needed.
 
-                   Track 1: Street Fighter.bin
+        :return: A tuple. See cache_build() for the content.
+        """
 
-                   Track 1: Street fighter.bin
+        if self._tx_cache is None:
+            self.cache_build()
 
-               Although the content of the .bin file is the same, the .cue files are different (notice the
-               capital-lowercase initial of "fighter"). In consequence, the hash of the .cue file is different and the
-               global hash of the whole game will be different. SO, TO AVOID THIS ISSUE, .CUE FILES AND OTHER META-DATA
-               FILES ARE NOT CONSIDERED WHEN CALCULATING THE HASH OF THE GAME.
+        return self._tx_cache
 
-        :return: A keyed dictionary with 'crc32', 'md5', and 'sha1' hashes in hex-string format
+    def cache_build(self):
         """
+        Method to compute, in a single pass over lo_roms, all the compound hashes and sizes of the romset (clean and
+        dirty crc32, md5, sha1 and size). See _get_hash() for an explanation of compound hashes and clean/dirty modes.
 
-        # Initialization
-        i_base10_value = 0
+        The data is stored in a cache tuple following the order of _tu_CACHE_KEYS: 'ccrc32', 'dcrc32', 'cmd5', 'dmd5',
+        'csha1', 'dsha1', 'csize' and 'dsize'.
 
-        # The first step is to create a list with the real ROMs, avoiding meta-data ones like .cue files
-        lo_relevant_roms = []
+        :return: Nothing.
+        """
 
-        for o_rom in self.lo_roms:
-            # If discard is not activated, every ROM will be considered
-            if not pb_clean:
-                lo_relevant_roms.append(o_rom)
+        self._tx_cache = None
+        caches_build((self,))
 
-            # In other case, ROMs are filtered based on the file extension
-            else:
-                if u'.' in o_rom.u_name:
-                    u_ext = o_rom.u_name.rpartition('.')[2].lower()
-
-                    # TODO: Move ignored extensions to a more global constant
-                    if u_ext not in lu_IGNORE_EXTS:
-                        lo_relevant_roms.append(o_rom)
-
-        for o_rom in lo_relevant_roms:
-
-            # Rom hash addition
-            if pu_type == 'crc32':
-                try:
-                    i_base10_value += int(o_rom.u_crc32, 16)
-                except ValueError:
-                    i_base10_value += 0
-            elif pu_type == 'md5':
-                try:
-                    i_base10_value += int(o_rom.u_md5, 16)
-                except ValueError:
-                    i_base10_value += 0
-            elif pu_type == 'sha1':
-                try:
-                    i_base10_value += int(o_rom.u_sha1, 16)
-                except ValueError:
-                    i_base10_value += 0
-            else:
-                raise Exception('Invalid pu_type "%s"' % pu_type)
-
-        # Converting base10 values to hex-string format
-        u_hash = '%x' % i_base10_value
-
-        # Resizing hashes to proper length (crc32 = 8 chars, md5 = 32 chars, sha1 = 40 chars)
-        if pu_type == 'crc32':
-            i_hash_length = 8
-        elif pu_type == 'md5':
-            i_hash_length = 32
-        elif pu_type == 'sha1':
-            i_hash_length = 40
-        else:
-            raise Exception('Invalid pu_type "%s"' % pu_type)
+    def cache_reset(self):
+        """
+        Method to discard the cache of compound hashes and sizes. It's automatically called when lo_roms is modified.
 
-        u_hash = u_hash[-i_hash_length:]
-        u_hash = u_hash.rjust(i_hash_length, '0')
+        :return: Nothing.
+        """
 
-        return u_hash
+        self._tx_cache = None
 
-    def _get_size(self, pb_clean=False):
+    def serialize(self):
         """
-        Method to get the size of a romset taking into account all the files (dirty mode) or just relevant files (clean
-        mode).
+        Method to convert the romset to plain python types (tuples, lists, unicode, integers...). The compound hashes are
+        included. See _romset_unserialize() for the opposite operation.
 
-        :param pb_clean: True for clean mode, False for dirty mode
+        :return: A tuple.
         """
-        lo_relevant_roms = []
-        i_global_size = 0
 
-        for o_rom in self.lo_roms:
-            # If discard is not activated, every ROM will be considered
-            if not pb_clean:
-                lo_relevant_roms.append(o_rom)
+        ltx_roms = []
+        for o_rom in self._lo_roms:
+            ltx_roms.append(o_rom.__getstate__())
 
-            # In other case, ROMs are filtered based on the file extension
-            else:
-                if u'.' in o_rom.u_name:
-                    u_ext = o_rom.u_name.rpartition('.')[2].lower()
+        return self.u_name, self.u_desc, self.i_year, self.u_auth, ltx_roms, self._get_cache()
+
+    def _get_roms(self):
+        return self._lo_roms
+
+    def _set_roms(self, plo_roms):
+        self._lo_roms = _RomList(self, plo_roms)
+        self.cache_reset()
+
+    lo_roms = property(fget=_get_roms, fset=_set_roms)
 
-                    if u_ext not in lu_IGNORE_EXTS:
-                        lo_relevant_roms.append(o_rom)
+    def _get_desc(self):
+        return self._u_desc
 
-        for o_rom in lo_relevant_roms:
-            i_global_size += o_rom.i_size
+    def _set_desc(self, pu_desc):
+        # The key used to sort the romsets is computed here once instead of every time a container is sorted.
+        self._u_desc = pu_desc
+        self.s_sort_key = pu_desc.encode('utf8', 'strict')
 
-        return i_global_size
+    u_desc = property(fget=_get_desc, fset=_set_desc)
 
-    # Properties with a bit of code behind
+    # Properties with a bit of code behind. They directly read the cache tuple because they are used A LOT.
     def _get_ccrc32(self):
-        return self._get_hash(pu_type='crc32', pb_clean=True)
+        return self._get_cache()[0]
 
     def _get_dcrc32(self):
-        return self._get_hash(pu_type='crc32', pb_clean=False)
+        return self._get_cache()[1]
 
     def _get_cmd5(self):
-        return self._get_hash(pu_type='md5', pb_clean=True)
+        return self._get_cache()[2]
 
     def _get_dmd5(self):
-        return self._get_hash(pu_type='md5', pb_clean=False)
+        return self._get_cache()[3]
 
     def _get_csha1(self):
-        return self._get_hash(pu_type='sha1', pb_clean=True)
+        return self._get_cache()[4]
 
     def _get_dsha1(self):
-        return self._get_hash(pu_type='sha1', pb_clean=False)
+        return self._get_cache()[5]
 
     def _get_csize(self):
-        return self._get_size(pb_clean=True)
+        return self._get_cache()[6]
 
     def _get_dsize(self):
-        return self._get_size(pb_clean=False)
+        return self._get_cache()[7]
 
     u_ccrc32 = property(fget=_get_ccrc32, fset=None)
     u_dcrc32 = property(fget=_get_dcrc32, fset=None)
@@ -828,21 +2036,91 @@ class _RomSet(object):
     i_dsize = property(fget=_get_dsize, fset=None)
 
 
-class _Rom:
+class _RomList(list):
+    """
+    List of _Rom objects that resets the cache of compound hashes of its owner _RomSet whenever it's modified.
+    """
+
+    def __init__(self, po_romset, plo_roms=()):
+        list.__init__(self, plo_roms)
+        self._o_romset = po_romset
+
+    def _modified(self):
+        self._o_romset.cache_reset()
+
+    def append(self, po_rom):
+        list.append(self, po_rom)
+        self._modified()
+
+    def extend(self, plo_roms):
+        list.extend(self, plo_roms)
+        self._modified()
+
+    def insert(self, pi_index, po_rom):
+        list.insert(self, pi_index, po_rom)
+        self._modified()
+
+    def pop(self, *pi_index):
+        o_rom = list.pop(self, *pi_index)
+        self._modified()
+        return o_rom
+
+    def remove(self, po_rom):
+        list.remove(self, po_rom)
+        self._modified()
+
+    def __setitem__(self, x_index, x_value):
+        list.__setitem__(self, x_index, x_value)
+        self._modified()
+
+    def __delitem__(self, x_index):
+        list.__delitem__(self, x_index)
+        self._modified()
+
+    def __setslice__(self, i_start, i_end, lo_roms):
+        list.__setslice__(self, i_start, i_end, lo_roms)
+        self._modified()
+
+    def __delslice__(self, i_start, i_end):
+        list.__delslice__(self, i_start, i_end)
+        self._modified()
+
+    def __iadd__(self, plo_roms):
+        o_output = list.__iadd__(self, plo_roms)
+        self._modified()
+        return o_output
+
+    def __imul__(self, pi_times):
+        o_output = list.__imul__(self, pi_times)
+        self._modified()
+        return o_output
+
+
+class _Rom(object):
     """
     Class to store all the information for a ROM file contained in a DAT file. Typically that information is the name
     of the ROM, the description, CRC-MD5-SHA1 check-sums...
+
+    Big DATs contain hundreds of thousands of roms so, to keep the memory usage low, the class uses __slots__ and the
+    check-sums are stored as integers (None when the DAT doesn't include them). u_crc32, u_md5 and u_sha1 properties
+    read and write them as hex-strings.
     """
 
+    __slots__ = ('u_name', 'i_size', 'i_crc32', 'i_md5', 'i_sha1')
+
     def __init__(self):
         # Variable definition
-        self.u_name = ''   # name of the ROM. i.e. 'Super Mario World.sfc'
-        self.u_crc32 = ''  # crc32 checksum of the file data i.e. 'a209fe80'
-        self.u_md5 = ''    # md5 checksum of the file data
-        self.u_sha1 = ''   # sha1 checksum of the file data
-        self.i_size = 0    # file size in bytes
+        self.u_name = ''     # name of the ROM. i.e. 'Super Mario World.sfc'
+        self.i_crc32 = None  # crc32 checksum of the file data i.e. 0xa209fe80
+        self.i_md5 = None    # md5 checksum of the file data
+        self.i_sha1 = None   # sha1 checksum of the file data
+        self.i_size = 0      # file size in bytes
+
+    def __getstate__(self):
+        return self.u_name, self.i_size, self.i_crc32, self.i_md5, self.i_sha1
 
-        # Variable population
+    def __setstate__(self, ptx_state):
+        self.u_name, self.i_size, self.i_crc32, self.i_md5, self.i_sha1 = ptx_state
 
     def __str__(self):
         u_output = u''
@@ -855,6 +2133,28 @@ class _Rom:
 
         return u_output.encode('utf8')
 
+    def _get_crc32(self):
+        return _hash_to_hex(self.i_crc32, 8)
+
+    def _set_crc32(self, pu_crc32):
+        self.i_crc32 = _hex_to_hash(pu_crc32)
+
+    def _get_md5(self):
+        return _hash_to_hex(self.i_md5, 32)
+
+    def _set_md5(self, pu_md5):
+        self.i_md5 = _hex_to_hash(pu_md5)
+
+    def _get_sha1(self):
+        return _hash_to_hex(self.i_sha1, 40)
+
+    def _set_sha1(self, pu_sha1):
+        self.i_sha1 = _hex_to_hash(pu_sha1)
+
+    u_crc32 = property(fget=_get_crc32, fset=_set_crc32)
+    u_md5 = property(fget=_get_md5, fset=_set_md5)
+    u_sha1 = property(fget=_get_sha1, fset=_set_sha1)
+
 
 # Functions
 #=======================================================================================================================
@@ -893,90 +2193,600 @@ def get_rom_header(pu_rom_file):
     return li_years_clean
 
 
+def caches_build(plo_romsets):
+    """
+    Function to compute, in a single batch, the compound hashes and sizes of many romsets. See _RomSet.cache_build().
+    Romsets already having them are skipped.
+
+    :param plo_romsets: Iterable of _RomSet objects.
+
+    :return: Nothing.
+    """
+
+    # Globals are copied to locals because they are used for every rom.
+    lu_ignore_exts = lu_IGNORE_EXTS
+    i_crc32_mask = _i_CRC32_MASK
+    i_md5_mask = _i_MD5_MASK
+    i_sha1_mask = _i_SHA1_MASK
+
+    for o_romset in plo_romsets:
+        if o_romset._tx_cache is not None:
+            continue
+
+        # Initialization. Clean and dirty values of crc32, md5, sha1 and size.
+        i_ccrc32 = i_dcrc32 = i_cmd5 = i_dmd5 = i_csha1 = i_dsha1 = i_csize = i_dsize = 0
+
+        for o_rom in o_romset._lo_roms:
+            # Missing hashes are considered as 0.
+            i_crc32 = o_rom.i_crc32 or 0
+            i_md5 = o_rom.i_md5 or 0
+            i_sha1 = o_rom.i_sha1 or 0
+
+            # Every ROM is considered for dirty values...
+            i_dcrc32 += i_crc32
+            i_dmd5 += i_md5
+            i_dsha1 += i_sha1
+            i_dsize += o_rom.i_size
+
+            # ...but, for clean ones, ROMs are filtered by the file extension.
+            u_rom_name = o_rom.u_name
+            if u'.' in u_rom_name and u_rom_name.rpartition('.')[2].lower() not in lu_ignore_exts:
+                i_ccrc32 += i_crc32
+                i_cmd5 += i_md5
+                i_csha1 += i_sha1
+                i_csize += o_rom.i_size
+
+        # Converting base10 values to hex-string format truncated to the proper length (crc32 = 8 chars, md5 = 32
+        # chars, sha1 = 40 chars). Same output as _hash_to_hex(), without a function call for each of them.
+        o_romset._tx_cache = ('%08x' % (i_ccrc32 & i_crc32_mask), '%08x' % (i_dcrc32 & i_crc32_mask),
+                              '%032x' % (i_cmd5 & i_md5_mask), '%032x' % (i_dmd5 & i_md5_mask),
+                              '%040x' % (i_csha1 & i_sha1_mask), '%040x' % (i_dsha1 & i_sha1_mask),
+                              i_csize, i_dsize)
+
+
+def dat_cache_path(pu_file, pu_cache_dir=None, pu_ext=u_DAT_CACHE_EXT):
+    """
+    Function to get the path of the compiled cache of a DAT file.
+
+    :param pu_file: DAT file. i.e. '/home/john/snes.dat'
+
+    :param pu_cache_dir: Directory of the cache files. If None, the cache is placed next to the DAT file.
+
+    :param pu_ext: Extension of the cache file. i.e. u_DAT_CACHE_EXT, u_DAT_INDEX_EXT
+
+    :return: The path of the cache file. i.e. '/home/john/snes.dat.hqcache' or, using a cache dir,
+             '/home/john/.cache/snes.dat.1a2b3c4d.hqcache'. Inside cache dirs, a short hash of the DAT path is added to
+             the name so DATs with the same name but placed in different directories don't share the cache.
+    """
+
+    if pu_cache_dir is None:
+        u_cache_file = u'%s.%s' % (pu_file, pu_ext)
+    else:
+        u_abs_file = os.path.abspath(pu_file)
+        if isinstance(u_abs_file, unicode):
+            u_abs_file = u_abs_file.encode('utf8')
+        u_path_hash = hashlib.sha1(u_abs_file).hexdigest()[:8]
+        u_cache_file = os.path.join(pu_cache_dir, u'%s.%s.%s' % (os.path.basename(pu_file), u_path_hash, pu_ext))
+
+    return u_cache_file
+
+
+def dat_compression(pu_file):
+    """
+    Function to identify the compression of a DAT file. The first bytes of the file are checked, so the extension of the
+    file doesn't matter.
+
+    :param pu_file: DAT file. i.e. '/home/john/snes.zip'
+
+    :return: The kind of compression: 'gz', 'bz2', 'xz', 'zip' or None when the file is not compressed.
+    """
+
+    o_file = open(pu_file, 'rb')
+    s_head = o_file.read(8)
+    o_file.close()
+
+    s_compression = None
+    for s_kind, s_magic in _tts_DAT_MAGIC_NUMBERS:
+        if s_head.startswith(s_magic):
+            s_compression = s_kind
+            break
+
+    return s_compression
+
+
+def dat_open(pu_file):
+    """
+    Function to open a DAT file for reading, uncompressing it on the fly when it's a .gz, .bz2, .xz or single file .zip
+    (see dat_compression()). The data is read as a stream, so the uncompressed DAT is never fully stored in memory or
+    disk.
+
+    :param pu_file: DAT file. i.e. '/home/john/snes.zip'
+
+    :return: A binary file-like object. It must be closed after using it.
+    """
+
+    s_compression = dat_compression(pu_file)
+
+    if s_compression is None:
+        o_file = open(pu_file, 'rb')
+
+    elif s_compression == 'gz':
+        o_file = gzip.GzipFile(pu_file, 'rb')
+
+    elif s_compression == 'bz2':
+        o_file = bz2.BZ2File(pu_file, 'rb')
+
+    elif s_compression == 'xz':
+        if lzma is None:
+            raise IOError('Reading .xz DATs requires the lzma module (pip install backports.lzma)')
+        o_file = lzma.LZMAFile(pu_file, 'rb')
+
+    else:
+        o_zip = zipfile.ZipFile(pu_file, 'r')
+        lo_infos = [o_info for o_info in o_zip.infolist() if not o_info.filename.endswith('/')]
+        if len(lo_infos) != 1:
+            o_zip.close()
+            raise IOError('Zip DAT files must contain a single file, %i found in "%s"' % (len(lo_infos), pu_file))
+        # The member keeps its own handle of the zip file, so the zip object can be closed.
+        o_file = o_zip.open(lo_infos[0])
+        o_zip.close()
+
+    return o_file
+
+
+def diff(po_old, po_new):
+    """
+    Function to find the changes between two versions of a DAT. Romsets are matched in linear time using dictionaries:
+
+        - First by id (dirty MD5). Romsets with the same roms and name are unchanged, with a different name, renamed.
+        - Then, the remaining romsets are matched by name. Romsets with the same name but different roms are changed.
+        - Romsets not matched at all are added (only in the new dat) or removed (only in the old dat).
+
+    :param po_old: RomSetContainer of the old DAT.
+
+    :param po_new: RomSetContainer of the new DAT.
+
+    :return: A DatDiffOut object.
+    """
+
+    o_output = DatDiffOut()
+    o_output.du_old_dat = _diff_dat_info(po_old)
+    o_output.du_new_dat = _diff_dat_info(po_new)
+
+    do_old_by_id = {}
+    for o_romset in po_old:
+        do_old_by_id.setdefault(o_romset.u_dmd5, o_romset)
+
+    # Matching by id
+    lo_new_unmatched = []
+    for o_new_romset in po_new:
+        o_old_romset = do_old_by_id.pop(o_new_romset.u_dmd5, None)
+
+        if o_old_romset is None:
+            lo_new_unmatched.append(o_new_romset)
+        elif o_old_romset.u_name == o_new_romset.u_name:
+            o_output.i_unchanged += 1
+        else:
+            o_output.lddu_renamed.append({'old': _diff_romset_info(o_old_romset),
+                                          'new': _diff_romset_info(o_new_romset)})
+
+    # Matching by name the romsets left in the old dat (do_old_by_id only contains unmatched romsets now)
+    do_old_by_name = {}
+    for o_romset in po_old:
+        if do_old_by_id.get(o_romset.u_dmd5) is o_romset:
+            do_old_by_name.setdefault(o_romset.u_name, o_romset)
+
+    for o_new_romset in lo_new_unmatched:
+        o_old_romset = do_old_by_name.pop(o_new_romset.u_name, None)
+
+        if o_old_romset is None:
+            o_output.ldu_added.append(_diff_romset_info(o_new_romset))
+        else:
+            o_output.lddu_changed.append({'old': _diff_romset_info(o_old_romset),
+                                          'new': _diff_romset_info(o_new_romset)})
+
+    # The old romsets not matched by name are the removed ones. They are kept in the order of the old dat.
+    for o_romset in po_old:
+        if do_old_by_name.get(o_romset.u_name) is o_romset:
+            o_output.ldu_removed.append(_diff_romset_info(o_romset))
+
+    return o_output
+
+
+def diff_load(pu_file):
+    """
+    Function to load the changes between two DATs saved with DatDiffOut.save().
+
+    :param pu_file: Json file. i.e. '/home/john/snes_changes.json'
+
+    :return: A DatDiffOut object.
+    """
+
+    o_file = open(pu_file, 'rb')
+    dx_data = json.load(o_file)
+    o_file.close()
+
+    o_output = DatDiffOut()
+    o_output.du_old_dat = dx_data['old_dat']
+    o_output.du_new_dat = dx_data['new_dat']
+    o_output.ldu_added = dx_data['added']
+    o_output.ldu_removed = dx_data['removed']
+    o_output.lddu_renamed = dx_data['renamed']
+    o_output.lddu_changed = dx_data['changed']
+    o_output.i_unchanged = dx_data['unchanged']
+
+    return o_output
+
+
+def load_dats(plu_files, pi_workers=None, pb_cache=False, pu_cache_dir=None):
+    """
+    Function to load several DAT files at once using a pool of processes, so each DAT is parsed in a different CPU core.
+    Workers send back the containers serialized as plain python types (see RomSetContainer._serialize()), which is much
+    faster than pickling the objects.
+
+    The biggest DATs are sent to the workers first, so the total time is close to the time needed for the biggest DAT
+    when there are enough cores.
+
+    :param plu_files: List of DAT files. i.e. ['/home/john/snes.dat', '/home/john/megadrive.dat']
+
+    :param pi_workers: Number of processes. If None, the number of CPUs of the machine is used.
+
+    :param pb_cache: If True, compiled caches of the DATs will be used (see RomSetContainer.read_from_dat()).
+
+    :param pu_cache_dir: Directory for the cache files. If None, they are placed next to the DAT files.
+
+    :return: A list of RomSetContainer objects in the same order of plu_files.
+    """
+
+    if pi_workers is None:
+        pi_workers = multiprocessing.cpu_count()
+
+    # Biggest DATs first. Missing files are sent anyway, so the proper error is raised by read_from_dat().
+    li_order = range(len(plu_files))
+    li_order.sort(key=lambda i_file: os.path.isfile(plu_files[i_file]) and os.path.getsize(plu_files[i_file]) or 0,
+                  reverse=True)
+
+    ltx_jobs = [(i_file, plu_files[i_file], pb_cache, pu_cache_dir) for i_file in li_order]
+
+    lo_containers = [None] * len(plu_files)
+
+    i_workers = min(pi_workers, len(ltx_jobs))
+
+    # With just one worker, there is no need to serialize anything.
+    if i_workers <= 1:
+        for i_file, u_file, b_cache, u_cache_dir in ltx_jobs:
+            lo_containers[i_file] = RomSetContainer(u_file, pb_cache=b_cache, pu_cache_dir=u_cache_dir)
+
+    else:
+        o_pool = multiprocessing.Pool(processes=i_workers)
+        try:
+            # Results are unserialized as soon as they arrive, while the workers are still parsing the biggest DATs.
+            for i_file, s_data in o_pool.imap_unordered(_dat_load_serialized, ltx_jobs, chunksize=1):
+                o_container = RomSetContainer()
+                o_container._unserialize(marshal.loads(s_data))
+                lo_containers[i_file] = o_container
+
+        except BaseException:
+            # The rest of DATs are not needed anymore, so the workers are stopped instead of waiting for them.
+            o_pool.terminate()
+            o_pool.join()
+            raise
+
+        o_pool.close()
+        o_pool.join()
+
+    return lo_containers
+
+
 # Helper Functions
 #=======================================================================================================================
-def _dat_vertical_parse(ls_lines, s_section, s_mode='single'):
-    """Function to parse a group of lines which contains different information about the same item.
+def _filter_apply(px_match, plo_romsets):
+    """
+    Function to apply a compiled filter (see Filter._compile()) to a list of romsets, giving a clear error for unknown
+    attributes.
+
+    :param px_match: Compiled filter function.
+
+    :param plo_romsets: List of _RomSet objects.
+
+    :return: A list of booleans, True for the romsets matching the filter.
+    """
+
+    try:
+        lb_matches = map(px_match, plo_romsets)
+
+    except AttributeError as o_error:
+        raise Exception('ERROR: You are trying to access an unknown attribute (%s)' % o_error)
+
+    return lb_matches
+
+
+def _hash_to_hex(pi_hash, pi_length):
+    """
+    Function to convert a hash stored as integer to its hex-string format.
+
+    :param pi_hash: Hash as integer or None. i.e. 2720595584
+
+    :param pi_length: Number of characters of the hash. i.e. 8 (crc32), 32 (md5), 40 (sha1)
+
+    :return: The hex-string. i.e. 'a209fe80'. An empty string if the hash is None.
+    """
+
+    if pi_hash is None:
+        s_hex = ''
+    else:
+        s_hex = '%0*x' % (pi_length, pi_hash)
+
+    return s_hex
+
+
+def _hex_to_hash(pu_hex):
+    """
+    Function to convert a hash in hex-string format to integer.
+
+    :param pu_hex: Hex-string. i.e. 'a209fe80'
+
+    :return: The hash as integer. i.e. 2720595584. None if the string is empty or it's not a valid hex number.
+    """
+
+    try:
+        i_hash = int(pu_hex, 16)
+    except (TypeError, ValueError):
+        i_hash = None
+
+    return i_hash
+
+
+def _romset_unserialize(ptx_data):
+    """
+    Function to rebuild a _RomSet object from the data generated by _RomSet.serialize().
+
+    :param ptx_data: Tuple of data.
+
+    :return: A _RomSet object.
+    """
+
+    u_name, u_desc, i_year, u_auth, ltx_roms, tx_cache = ptx_data
+
+    lo_roms = []
+    for tx_rom in ltx_roms:
+        o_rom = _Rom.__new__(_Rom)
+        o_rom.__setstate__(tx_rom)
+        lo_roms.append(o_rom)
+
+    o_romset = _RomSet(u_name, u_desc)
+    o_romset.i_year = i_year
+    o_romset.u_auth = u_auth
+    o_romset.lo_roms = lo_roms
+
+    # The cache must be restored after setting lo_roms because setting them resets it.
+    o_romset._tx_cache = tx_cache
+
+    return o_romset
+
+
+def _dat_load_serialized(ptx_job):
+    """
+    Function run by the workers of load_dats() to read a DAT file.
+
+    :param ptx_job: Tuple (position of the DAT in the input list, DAT file, use cache, cache dir).
+
+    :return: A tuple (position of the DAT, serialized container dumped with marshal). See RomSetContainer._serialize().
+    """
 
-    So, the information follows a pattern similar to:
+    i_file, u_file, b_cache, u_cache_dir = ptx_job
 
-        field_1 data_a
-        field_1 data_b
-        field_2 data_c
-        ...
+    o_container = RomSetContainer(u_file, pb_cache=b_cache, pu_cache_dir=u_cache_dir)
 
-        ls_lines: a list containing the individual lines as strings.
+    return i_file, marshal.dumps(o_container._serialize())
 
-        s_section: name of the section (in the above example s_section = field_1, for example).
 
-        s_mode: 'single', each field exists once and the function returns its data as a string.
-                'multi', each field exists several times and the function returns its data as a list of strings.
+def _dat_fingerprint(pu_file):
+    """
+    Function to get the fingerprint of a DAT file used to know if its compiled cache is up to date.
+
+    :param pu_file: DAT file. i.e. '/home/john/snes.dat'
+
+    :return: A tuple (cache version, library version, absolute path, size, modification time).
+    """
+
+    o_stat = os.stat(pu_file)
+
+    return _i_DAT_CACHE_VERSION, _u_VERSION, os.path.abspath(pu_file), o_stat.st_size, o_stat.st_mtime
+
+
+def _csv_row_import(po_romset, plu_row, plo_fields, pb_overwrite):
+    """
+    Function to import the data of a csv row into a romset. See RomSetContainer.csv_import().
+
+    :param po_romset: _RomSet object to update.
+
+    :param plu_row: List of unicode values of the row.
+
+    :param plo_fields: List of Field objects indicating which columns to import.
+
+    :param pb_overwrite: If True, imported data will overwrite the previous existing data.
+
+    :return: Nothing.
+    """
+
+    for o_update_field in plo_fields:
+        if o_update_field.s_dst_field == 'i_year':
+            if pb_overwrite or po_romset.i_year == 0:
+                po_romset.i_year = int(plu_row[o_update_field.i_src_column])
 
-        @rtype : string or list of strings
+        elif o_update_field.s_dst_field == 'u_desc':
+            # Description field always has content so no need to check for "empty".
+            if pb_overwrite:
+                po_romset.u_desc = plu_row[o_update_field.i_src_column]
+
+        elif o_update_field.s_dst_field == 'u_auth':
+            if pb_overwrite or po_romset.u_auth == u'':
+                po_romset.u_auth = plu_row[o_update_field.i_src_column]
+
+        # TODO: Add new fields to romset like genre, number of players, etc... that can be imported
+        else:
+            raise ValueError('Invalid value to update "%s"' % o_update_field.s_dst_field)
+
+
+def _diff_dat_info(po_container):
+    """
+    Function to get the basic information of a DAT stored by diff().
+
+    :param po_container: RomSetContainer object.
+
+    :return: A dictionary. i.e. {'u_name': u'Nintendo - Super Nintendo', 'u_description': u'...', 'u_version': u'...'}
     """
 
-    ls_data = []
-    s_data = ''
+    return {'u_name': po_container.u_name,
+            'u_description': po_container.u_description,
+            'u_version': po_container.u_version}
+
+
+def _diff_romset_info(po_romset):
+    """
+    Function to get the data of a romset stored by diff().
+
+    :param po_romset: _RomSet object.
+
+    :return: A dictionary with the fields in _tu_DIFF_FIELDS. i.e. {'u_name': u'Super Mario World (Europe)', ...}
+    """
+
+    return dict([(s_field, getattr(po_romset, s_field)) for s_field in _tu_DIFF_FIELDS])
+
 
-    # Adding a space to the section because it has to exist a space between the section and the data.
-    s_section += ' '
+def _lazy_index_key(ps_field, px_value):
+    """
+    Function to get the key used in the indexes of LazyRomSetContainer for a field value. Hashes are stored as integers
+    (see _hex_to_hash()) because they need less memory than strings.
+
+    :param ps_field: Name of the field. i.e. 'u_dmd5'
 
-    for s_line in ls_lines:
-        s_line = s_line.strip()
+    :param px_value: Value of the field. i.e. u'0a1b2c3d...'
 
-        if s_line.find(s_section) == 0:
-            i_start_pos = len(s_section)
-            s_data = s_line[i_start_pos:]
-            s_data = s_data.strip()
-            s_data = s_data.strip('"')
-            ls_data.append(s_data)
+    :return: The key. i.e. 13371337...
+    """
 
-    if s_mode == 'single':
-        x_output = s_data
-    elif s_mode == 'multi':
-        x_output = ls_data
+    if ps_field in ('u_name', 'u_desc'):
+        x_key = px_value
     else:
-        raise Exception('Error: %s mode for _dat_vertical_parse() NOT known.' % s_mode)
+        x_key = _hex_to_hash(px_value)
+
+    return x_key
+
+
+def _cmp_chunk_offsets(pu_file, pi_chunks):
+    """
+    Function to split a ClrMamePro DAT in chunks that can be parsed independently. Each chunk (but the first one, that
+    contains the heading) begins with an unindented romset block line, i.e. 'game (', so no block is split between two
+    chunks.
+
+    :param pu_file: DAT file. i.e. '/home/john/mame.dat'
+
+    :param pi_chunks: Desired number of chunks. Less chunks are returned for small DATs.
+
+    :return: A sorted list of byte offsets, starting with 0 and ending with the size of the file. i.e. [0, 5120, 10000]
+    """
+
+    i_size = os.path.getsize(pu_file)
+    li_offsets = [0]
+
+    o_file = open(pu_file, 'rb')
+
+    for i_chunk in range(1, pi_chunks):
+        i_target = max(i_size * i_chunk / pi_chunks, li_offsets[-1])
+
+        # The target offset is usually in the middle of a line, so we skip to the next one before searching.
+        o_file.seek(i_target)
+        o_file.readline()
+
+        while True:
+            i_line_start = o_file.tell()
+            s_line = o_file.readline()
+            if not s_line:
+                i_line_start = i_size
+                break
+            if _o_CMP_GAME_START_RE.match(s_line):
+                break
+
+        if li_offsets[-1] < i_line_start < i_size:
+            li_offsets.append(i_line_start)
+
+    o_file.close()
+
+    li_offsets.append(i_size)
+
+    return li_offsets
+
 
-    return x_output
+def _cmp_chunk_parse(ptx_job):
+    """
+    Function run by the workers of RomSetContainer._read_from_cmp_parallel() to parse a chunk of a ClrMamePro DAT.
 
+    :param ptx_job: Tuple (DAT file, start offset, end offset).
 
-def _dat_horizontal_parse(s_line, s_start, s_end):
+    :return: A tuple (heading, list of serialized romsets in file order) dumped with marshal. The heading is a tuple
+             (name, description, version, comment) if the chunk contains it, or None in other case.
     """
-    Function to parse a SINGLE line containing information about a particular item.
 
-    So, the information follows a pattern similar to:
+    u_file, i_start, i_end = ptx_job
+
+    o_file = open(u_file, 'rb')
+    o_file.seek(i_start)
+    s_data = o_file.read(i_end - i_start)
+    o_file.close()
+
+    # Chunks start and end at line boundaries, so no multi-byte utf8 characters are split.
+    o_container = RomSetContainer()
+    o_container._parse_cmp_lines(s_data.decode('utf8', 'ignore').splitlines())
 
-        a_start DATA_A a_end b_start DATA_B b_end...
+    tu_heading = (o_container.u_name, o_container.u_description, o_container.u_version, o_container.u_comment)
+    if not any(tu_heading):
+        tu_heading = None
 
-    :param s_line: string containing the line to be parsed.
+    # The compound hashes are computed here too, so the main process doesn't have to do it.
+    ltx_romsets = [o_romset.serialize() for o_romset in o_container.lo_games]
+
+    return marshal.dumps((tu_heading, ltx_romsets))
+
+
+def _cmp_rom_parse(pu_data):
+    """
+    Function to parse the data of a ClrMamePro rom line and build a _Rom object with it.
 
-    :param s_start: leading string for data. In the above example: "a_start", "b_start"...
+    The data follows a pattern similar to:
 
-    :param s_end: ending string for data. In the above example: "a_end", "b_end"...
+        ( name "Super Mario World (Europe).sfc" size 524288 crc b19ed489 md5 cdd3c8c37322978ca8669b34bc89c804 )
 
-    Comment: Typically, all the items inside the line are unique, so there is no need to 'multi' parameter like in
-    _dat_vertical_parse() function.
+    Names can be quoted or not. Unquoted names can contain spaces, so every token found until the next known field is
+    considered part of the value.
 
-        @rtype: string
+    :param pu_data: Rom data (everything after the "rom" word in the line).
 
+    :return: A _Rom object.
     """
 
-    s_output = ''
+    u_data = pu_data.strip()
+    if u_data.startswith(u'(') and u_data.endswith(u')'):
+        u_data = u_data[1:-1]
 
-    if s_line.find(s_start) != -1:
-        i_start_pos = s_line.find(s_start) + len(s_start)
-        i_end_pos = s_line.find(s_end, i_start_pos)
+    dlu_values = {}
+    lu_current = None
 
-        if i_end_pos != -1:
-            s_output = s_line[i_start_pos:i_end_pos]
+    for u_quoted, u_plain in _o_CMP_TOKEN_RE.findall(u_data):
+        if u_plain in _tu_CMP_ROM_FIELDS:
+            lu_current = dlu_values.setdefault(u_plain, [])
+        elif lu_current is not None:
+            lu_current.append(u_quoted or u_plain)
 
-    # It shouldn't appear extra spaces around the real data but just in case...
-    s_output = s_output.strip()
-    s_output = s_output.strip('"')
-    s_output = s_output.strip()
+    o_rom = _Rom()
+    o_rom.u_name = u' '.join(dlu_values.get(u'name', ()))
+    o_rom.i_size = int(u''.join(dlu_values.get(u'size', ())) or 0)
+    o_rom.i_crc32 = _hex_to_hash(u''.join(dlu_values.get(u'crc', ())))
+    o_rom.i_md5 = _hex_to_hash(u''.join(dlu_values.get(u'md5', ())))
+    o_rom.i_sha1 = _hex_to_hash(u''.join(dlu_values.get(u'sha1', ())))
 
-    return s_output
+    return o_rom
 
 
 #def _sum_crc32(u_crc32_a, u_crc32_b):
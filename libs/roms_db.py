@@ -0,0 +1,593 @@
+# -*- coding: utf-8 -*-
+
+"""
+Library to store the romsets of a RomSetContainer in a SQLite database file, so big collections don't need to be parsed
+and kept in memory every time they are used.
+"""
+
+import itertools
+import json
+import sqlite3
+
+import roms
+
+
+# Constants
+#=======================================================================================================================
+_i_SCHEMA_VERSION = 1                       # Increase it when the tables change. Old databases are rebuilt.
+_i_BATCH = 500                              # Maximum number of values in a single "IN (...)" SQL clause
+
+_tu_ROMSET_COLUMNS = ('u_name', 'u_desc', 'i_year', 'u_auth',
+                      'u_ccrc32', 'u_dcrc32', 'u_cmd5', 'u_dmd5', 'u_csha1', 'u_dsha1', 'i_csize', 'i_dsize')
+_tu_ROM_COLUMNS = ('u_name', 'i_size', 'u_crc32', 'u_md5', 'u_sha1')
+_tu_INDEXED_COLUMNS = ('u_name', 'u_desc', 'i_year', 'u_auth',
+                       'u_ccrc32', 'u_dcrc32', 'u_cmd5', 'u_dmd5', 'u_csha1', 'u_dsha1')
+_tu_METADATA_KEYS = ('u_name', 'u_description', 'u_version', 'u_comment', 'u_type', 'u_author', '_db_flags')
+
+_tu_SCHEMA = ('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)',
+              'CREATE TABLE IF NOT EXISTS romsets (id INTEGER PRIMARY KEY, s_sort_key BLOB, %s)' %
+              ', '.join(_tu_ROMSET_COLUMNS),
+              'CREATE TABLE IF NOT EXISTS roms (i_romset INTEGER, i_order INTEGER, %s)' % ', '.join(_tu_ROM_COLUMNS),
+              'CREATE INDEX IF NOT EXISTS romsets_sort ON romsets (s_sort_key, id)',
+              'CREATE INDEX IF NOT EXISTS roms_romset ON roms (i_romset, i_order)') + \
+             tuple(['CREATE INDEX IF NOT EXISTS romsets_%s ON romsets (%s)' % (s_column, s_column)
+                    for s_column in _tu_INDEXED_COLUMNS])
+
+
+# Classes
+#=======================================================================================================================
+class SqliteRomSetContainer(roms.RomSetContainer):
+    """
+    RomSetContainer storing its romsets (including the data imported with csv_import()) in a SQLite database file
+    instead of memory. Romsets are read from the database when they are needed, iterating over the container or
+    searching them with get_romsets_by_field(), which uses the indexes of the database.
+
+    Using read_from_dat(), the database is only rebuilt when the DAT file changes.
+    """
+
+    def __init__(self, pu_db_file, u_file=None, pb_cache=False, pu_cache_dir=None, pi_workers=1):
+        roms.RomSetContainer.__init__(self)
+
+        self.u_db_file = pu_db_file
+
+        self._o_db = sqlite3.connect(pu_db_file)
+        self._o_db.text_factory = unicode
+
+        if self._metadata_get(u'i_schema_version') != _i_SCHEMA_VERSION:
+            self._o_db.executescript('DROP TABLE IF EXISTS metadata; '
+                                     'DROP TABLE IF EXISTS romsets; '
+                                     'DROP TABLE IF EXISTS roms;')
+
+        for s_sql in _tu_SCHEMA:
+            self._o_db.execute(s_sql)
+        self._metadata_set(u'i_schema_version', _i_SCHEMA_VERSION)
+        self._o_db.commit()
+
+        self._metadata_load()
+
+        if u_file:
+            self.read_from_dat(u_file, pb_cache=pb_cache, pu_cache_dir=pu_cache_dir, pi_workers=pi_workers)
+
+    def __iter__(self):
+        o_cursor = self._o_db.execute('SELECT r.id, %s, %s FROM romsets r LEFT JOIN roms m ON m.i_romset = r.id '
+                                      'ORDER BY r.s_sort_key, r.id, m.i_order' %
+                                      (', '.join(['r.%s' % s_column for s_column in _tu_ROMSET_COLUMNS]),
+                                       ', '.join(['m.%s' % s_column for s_column in _tu_ROM_COLUMNS])))
+
+        i_romset_columns = len(_tu_ROMSET_COLUMNS) + 1
+
+        # Each row contains the data of a romset and one of its roms, so rows are grouped by romset.
+        for i_id, itx_rows in itertools.groupby(o_cursor, key=lambda tx_row: tx_row[0]):
+            ltx_rows = list(itx_rows)
+            ltx_roms = [tx_row[i_romset_columns:] for tx_row in ltx_rows if tx_row[i_romset_columns] is not None]
+            yield _romset_build(ltx_rows[0][1:i_romset_columns], ltx_roms)
+
+    def __len__(self):
+        return self.i_games
+
+    def close(self):
+        """
+        Method to close the database.
+
+        :return: Nothing.
+        """
+
+        self._o_db.close()
+
+    def _add_romset(self, o_romset):
+        """
+        Internal method to add games to the database WITHOUT any kind of duplicity check. Changes are not committed.
+
+        :param o_romset: _RomSet to add.
+
+        :return: Nothing.
+        """
+
+        self._romsets_insert([o_romset])
+
+    def add_romset(self, o_romset):
+        """
+        Method to add a new romset to the database. The id of the romset is its dirty MD5 (u_dmd5).
+
+        :param o_romset: _RomSet to add.
+
+        :return: True if the game was successfully added, false in other case.
+        """
+
+        return self.add_romsets([o_romset]) == 1
+
+    def add_romsets(self, plo_romsets):
+        """
+        Method to add many romsets to the database at once. Romsets whose id already exists in the database (or earlier
+        in plo_romsets) are skipped.
+
+        :param plo_romsets: Iterable of _RomSet objects. i.e. another RomSetContainer.
+
+        :return: Number of added romsets.
+        """
+
+        su_ids = set()
+        lo_romsets = []
+
+        for o_romset in plo_romsets:
+            if (o_romset is not None) and (o_romset.u_dmd5 not in su_ids) and not self.id_exists(o_romset.u_dmd5):
+                su_ids.add(o_romset.u_dmd5)
+                lo_romsets.append(o_romset)
+
+        if lo_romsets:
+            self._romsets_insert(lo_romsets)
+            self._o_db.commit()
+
+        return len(lo_romsets)
+
+    def empty(self):
+        """
+        Method to remove all the games of the database but keeping the meta-data.
+
+        :return: Nothing
+        """
+
+        self._romsets_delete()
+        self._o_db.commit()
+
+    def copy_metadata_from(self, o_game_container):
+        roms.RomSetContainer.copy_metadata_from(self, o_game_container)
+        self._metadata_save()
+
+    def modify_metadata(self, u_start=u'', u_end=u''):
+        roms.RomSetContainer.modify_metadata(self, u_start, u_end)
+        self._metadata_save()
+
+    def csv_import(self, po_csv=None, po_id_field=None, plo_fields=None, pb_overwrite=False):
+        """
+        Method to import data from a csv object. Same as RomSetContainer.csv_import() but the imported data is saved
+        to the database.
+
+        :return: A CsvImportOut object with the ids of the matched and unmatched rows.
+        """
+
+        o_output = roms.CsvImportOut()
+
+        if po_id_field and plo_fields:
+            self._db_flags['data_imported'] = True
+
+            if isinstance(po_csv, (list, tuple)):
+                lo_csvs = po_csv
+            else:
+                lo_csvs = [po_csv]
+
+            for o_csv in lo_csvs:
+                for lu_row in o_csv.llu_rows:
+                    u_csv_id = lu_row[po_id_field.i_src_column]
+
+                    # Id field should be unique, so only the first matching romset is updated
+                    lti_romsets = self._romsets_find(po_id_field.s_dst_field, True, [u_csv_id])
+                    if not lti_romsets:
+                        o_output.lu_unmatched.append(u_csv_id)
+                        continue
+
+                    o_output.lu_matched.append(u_csv_id)
+
+                    i_id = lti_romsets[0][1]
+                    o_romset = self._romsets_load([i_id])[0]
+                    roms._csv_row_import(o_romset, lu_row, plo_fields, pb_overwrite)
+
+                    self._o_db.execute('UPDATE romsets SET s_sort_key = ?, u_desc = ?, i_year = ?, u_auth = ? '
+                                       'WHERE id = ?',
+                                       (sqlite3.Binary(o_romset.s_sort_key), o_romset.u_desc, o_romset.i_year,
+                                        o_romset.u_auth, i_id))
+
+            self._metadata_save()
+
+        return o_output
+
+    def filter(self, o_filter):
+        """
+        Method to filter in/out games depending on a filter. Same as RomSetContainer.filter(), the output containers are
+        regular (in memory) RomSetContainer objects.
+        """
+
+        o_matched_container = roms.RomSetContainer()
+        o_matched_container.copy_metadata_from(self)
+        o_matched_container.modify_metadata(u'FILTER(', u')')
+        o_unmatched_container = roms.RomSetContainer()
+        o_unmatched_container.copy_metadata_from(self)
+
+        px_match = o_filter._compile()
+
+        for lo_romsets in _batches(self, _i_BATCH):
+            for o_romset, b_match in zip(lo_romsets, roms._filter_apply(px_match, lo_romsets)):
+                if b_match:
+                    o_matched_container._add_romset(o_romset)
+                else:
+                    o_unmatched_container._add_romset(o_romset)
+
+        return o_matched_container, o_unmatched_container
+
+    def query(self, po_filter):
+        """
+        Method to get the games matching a filter. Same as RomSetContainer.query() but the romsets are read from the
+        database in batches, so just the matched ones are kept in memory.
+
+        :return: A RomSetView object with the matched games.
+        """
+
+        px_match = po_filter._compile()
+
+        lo_matched = []
+        for lo_romsets in _batches(self, _i_BATCH):
+            for o_romset, b_match in zip(lo_romsets, roms._filter_apply(px_match, lo_romsets)):
+                if b_match:
+                    lo_matched.append(o_romset)
+
+        return roms.RomSetView(self, lo_matched)
+
+    def id_exists(self, u_id):
+        """
+        Method to check if a id already exists in the database
+        :param u_id: id to check (dirty MD5 of the romset).
+        :return: True if the id already exists, False in other case.
+        """
+
+        return self._o_db.execute('SELECT 1 FROM romsets WHERE u_dmd5 = ? LIMIT 1', (u_id,)).fetchone() is not None
+
+    def _duplicates_found(self):
+        """
+        Method to check the existence of duplicated ids in the database.
+
+        :return: True if duplicates were found, False in other case.
+        """
+
+        return self._o_db.execute('SELECT 1 FROM romsets GROUP BY u_dmd5 HAVING COUNT(*) > 1 LIMIT 1').fetchone() \
+            is not None
+
+    def _show_duplicates(self):
+        """
+        Method to get the duplicated ids of the database.
+
+        :return: A dictionary {duplicated id: set of names of the romsets sharing it}.
+        """
+
+        dsu_duplicates = {}
+
+        o_cursor = self._o_db.execute('SELECT u_dmd5, u_name FROM romsets WHERE u_dmd5 IN '
+                                      '(SELECT u_dmd5 FROM romsets GROUP BY u_dmd5 HAVING COUNT(*) > 1)')
+        for u_id, u_name in o_cursor:
+            dsu_duplicates.setdefault(u_id, set()).add(u_name)
+
+        return dsu_duplicates
+
+    def get_romsets_by_field(self, pu_field, pb_first, *px_search_values):
+        """
+        Method to get a list of MULTIPLE GAMES with certain content in a field. The search is performed by the database
+        using the index of the field.
+
+        :param pu_field: Name of the field. i.e. 'i_year'
+
+        :param pb_first: If True, only the first found romset will be returned.
+
+        :param px_search_values: Content of the field to search for. i.e. 1985, 1986
+
+        :return: A list with the found romsets.
+        """
+
+        if pu_field not in self._tu_valid_search_fields:
+            raise ValueError('Error: pu_field must be one of %s' % str(self._tu_valid_search_fields))
+
+        lti_romsets = self._romsets_find(pu_field, pb_first, px_search_values)
+
+        return self._romsets_load([i_id for s_sort_key, i_id in lti_romsets])
+
+    def read_from_dat(self, pu_file, pb_cache=False, pu_cache_dir=None, pi_workers=1):
+        """
+        Method to load Dat data from a file on disk into the database. If the database already contains the data of the
+        same (unmodified) DAT file, nothing is done, so data imported with csv_import() is kept.
+
+        See RomSetContainer.read_from_dat() for the parameters. An up to date compiled cache of the DAT is used, but it's
+        never written, the database itself is kept between runs.
+
+        :return: Nothing.
+        """
+
+        x_fingerprint = list(roms._dat_fingerprint(pu_file))
+
+        if self._metadata_get(u'x_dat_fingerprint') == x_fingerprint:
+            return
+
+        # The romsets are inserted in the database as they are parsed (see _romsets_register()), in the same
+        # transaction than the removal of the old ones. So the old data is kept when the DAT can't be read.
+        self._romsets_delete()
+
+        o_defaults = roms.RomSetContainer()
+        for s_key in _tu_METADATA_KEYS:
+            setattr(self, s_key, getattr(o_defaults, s_key))
+
+        try:
+            roms.RomSetContainer.read_from_dat(self, pu_file, pb_cache=pb_cache, pu_cache_dir=pu_cache_dir,
+                                               pi_workers=pi_workers)
+        except BaseException:
+            self._o_db.rollback()
+            self._metadata_load()
+            raise
+
+        self._metadata_set(u'x_dat_fingerprint', x_fingerprint)
+        self._metadata_save()
+
+    def _romsets_insert(self, plo_romsets):
+        """
+        Method to insert romsets in the database. Changes are not committed.
+
+        :param plo_romsets: Iterable of _RomSet objects.
+
+        :return: Nothing.
+        """
+
+        s_romset_sql = 'INSERT INTO romsets (id, s_sort_key, %s) VALUES (?, ?, %s)' % \
+                       (', '.join(_tu_ROMSET_COLUMNS), ', '.join('?' * len(_tu_ROMSET_COLUMNS)))
+        s_rom_sql = 'INSERT INTO roms (i_romset, i_order, %s) VALUES (?, ?, %s)' % \
+                    (', '.join(_tu_ROM_COLUMNS), ', '.join('?' * len(_tu_ROM_COLUMNS)))
+
+        o_cursor = self._o_db.cursor()
+
+        # Ids are set here instead of by the database, so each batch of romsets (and their roms) is inserted with a
+        # single executemany().
+        i_id = o_cursor.execute('SELECT MAX(id) FROM romsets').fetchone()[0] or 0
+
+        for lo_romsets in _batches(plo_romsets, _i_BATCH):
+            llx_romsets = []
+            llx_roms = []
+            for o_romset in lo_romsets:
+                i_id += 1
+                llx_romsets.append([i_id, sqlite3.Binary(o_romset.s_sort_key)] +
+                                   [getattr(o_romset, s_column) for s_column in _tu_ROMSET_COLUMNS])
+                llx_roms.extend([[i_id, i_order] + [getattr(o_rom, s_column) for s_column in _tu_ROM_COLUMNS]
+                                 for i_order, o_rom in enumerate(o_romset.lo_roms)])
+
+            o_cursor.executemany(s_romset_sql, llx_romsets)
+            o_cursor.executemany(s_rom_sql, llx_roms)
+
+            self.i_games += len(lo_romsets)
+
+    def _romsets_find(self, ps_field, pb_first, plx_values):
+        """
+        Method to find romsets in the database by the value of a field.
+
+        :param ps_field: Name of the field. i.e. 'u_dmd5'
+
+        :param pb_first: If True, only the first found romset is returned.
+
+        :param plx_values: List of values to search for.
+
+        :return: A sorted list of tuples (sort key, id of the romset in the database).
+        """
+
+        # The field name is written straight into the SQL query, so only the indexed columns are accepted.
+        if ps_field not in _tu_INDEXED_COLUMNS:
+            raise ValueError('Error: ps_field must be one of %s' % str(_tu_INDEXED_COLUMNS))
+
+        stx_romsets = set()
+
+        lx_values = list(plx_values)
+        for i_start in range(0, len(lx_values), _i_BATCH):
+            lx_batch = lx_values[i_start:i_start + _i_BATCH]
+            o_cursor = self._o_db.execute('SELECT s_sort_key, id FROM romsets WHERE %s IN (%s)' %
+                                          (ps_field, ', '.join('?' * len(lx_batch))), lx_batch)
+            stx_romsets.update([(str(s_sort_key), i_id) for s_sort_key, i_id in o_cursor])
+
+        lti_romsets = sorted(stx_romsets)
+        if pb_first:
+            lti_romsets = lti_romsets[:1]
+
+        return lti_romsets
+
+    def _romsets_delete(self):
+        """
+        Method to remove all the romsets of the database. Changes are not committed.
+
+        :return: Nothing.
+        """
+
+        self._o_db.execute('DELETE FROM romsets')
+        self._o_db.execute('DELETE FROM roms')
+
+        roms.RomSetContainer.empty(self)
+
+    def _romsets_register(self, plo_romsets):
+        """
+        Method to insert in the database the romsets read from a DAT. Parsers call it for each batch of romsets, so the
+        whole DAT is never kept in memory. Changes are not committed.
+
+        :param plo_romsets: List of _RomSet objects.
+
+        :return: Nothing.
+        """
+
+        roms.caches_build(plo_romsets)
+        self._romsets_insert(plo_romsets)
+
+    def _unserialize(self, ptx_data):
+        """
+        Method to insert in the database the data generated by RomSetContainer._serialize() (i.e. a compiled cache of a
+        DAT). Romsets are rebuilt and inserted in batches, so they are never kept in memory at once. Changes are not
+        committed.
+
+        :param ptx_data: Tuple of data.
+
+        :return: Nothing.
+        """
+
+        dx_metadata, ltx_romsets, ddli_indexes = ptx_data
+
+        try:
+            for ltx_batch in _batches(ltx_romsets, _i_BATCH):
+                self._romsets_register([roms._romset_unserialize(tx_romset) for tx_romset in ltx_batch])
+
+        except BaseException:
+            # The romsets already inserted are removed, so the DAT can be parsed instead (see
+            # RomSetContainer._dat_cache_load()).
+            self._romsets_delete()
+            raise
+
+        for u_key, x_value in dx_metadata.iteritems():
+            setattr(self, u_key, x_value)
+
+    def _dat_cache_save(self, pu_file, pu_cache_dir=None):
+        """
+        Method to write the compiled cache of the DAT. It does nothing, the romsets are not kept in memory and the
+        database itself is kept between runs.
+
+        :return: False.
+        """
+
+        return False
+
+    def _romsets_load(self, pli_ids):
+        """
+        Method to read romsets from the database.
+
+        :param pli_ids: List of ids of the romsets in the database.
+
+        :return: A list of _RomSet objects in the same order of pli_ids.
+        """
+
+        dtx_romsets = {}
+        dltx_roms = {}
+
+        for i_start in range(0, len(pli_ids), _i_BATCH):
+            li_batch = pli_ids[i_start:i_start + _i_BATCH]
+            s_ids = ', '.join('?' * len(li_batch))
+
+            o_cursor = self._o_db.execute('SELECT id, %s FROM romsets WHERE id IN (%s)' %
+                                          (', '.join(_tu_ROMSET_COLUMNS), s_ids), li_batch)
+            for tx_row in o_cursor:
+                dtx_romsets[tx_row[0]] = tx_row[1:]
+
+            o_cursor = self._o_db.execute('SELECT i_romset, %s FROM roms WHERE i_romset IN (%s) ORDER BY i_order' %
+                                          (', '.join(_tu_ROM_COLUMNS), s_ids), li_batch)
+            for tx_row in o_cursor:
+                dltx_roms.setdefault(tx_row[0], []).append(tx_row[1:])
+
+        return [_romset_build(dtx_romsets[i_id], dltx_roms.get(i_id, [])) for i_id in pli_ids]
+
+    def _metadata_get(self, pu_key):
+        """
+        Method to read a value of the metadata table.
+
+        :param pu_key: Key of the value. i.e. u'u_name'
+
+        :return: The value, or None if the key (or the table) doesn't exist.
+        """
+
+        try:
+            tu_row = self._o_db.execute('SELECT value FROM metadata WHERE key = ?', (pu_key,)).fetchone()
+        except sqlite3.OperationalError:
+            tu_row = None
+
+        if tu_row is None:
+            x_value = None
+        else:
+            x_value = json.loads(tu_row[0])
+
+        return x_value
+
+    def _metadata_set(self, pu_key, px_value):
+        """
+        Method to write a value of the metadata table. Changes are not committed.
+
+        :param pu_key: Key of the value. i.e. u'u_name'
+
+        :param px_value: Value. It must be json serializable.
+
+        :return: Nothing.
+        """
+
+        self._o_db.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', (pu_key, json.dumps(px_value)))
+
+    def _metadata_load(self):
+        """
+        Method to read the metadata of the DAT from the database.
+
+        :return: Nothing.
+        """
+
+        for s_key in _tu_METADATA_KEYS:
+            x_value = self._metadata_get(s_key)
+            if x_value is not None:
+                setattr(self, s_key, x_value)
+
+        self.i_games = self._o_db.execute('SELECT COUNT(*) FROM romsets').fetchone()[0]
+
+    def _metadata_save(self):
+        """
+        Method to save the metadata of the DAT to the database and commit all the pending changes.
+
+        :return: Nothing.
+        """
+
+        for s_key in _tu_METADATA_KEYS:
+            self._metadata_set(s_key, getattr(self, s_key))
+
+        self._o_db.commit()
+
+
+# Helper Functions
+#=======================================================================================================================
+def _batches(pi_iterable, pi_size):
+    """
+    Function to split an iterable in lists of a maximum size.
+
+    :param pi_iterable: Iterable. i.e. a SqliteRomSetContainer.
+
+    :param pi_size: Maximum size of the lists.
+
+    :return: A generator of lists.
+    """
+
+    o_iterator = iter(pi_iterable)
+    while True:
+        lx_batch = list(itertools.islice(o_iterator, pi_size))
+        if not lx_batch:
+            break
+        yield lx_batch
+
+
+def _romset_build(ptx_romset, pltx_roms):
+    """
+    Function to build a _RomSet object from the rows of the database.
+
+    :param ptx_romset: Row of the romsets table with the columns in _tu_ROMSET_COLUMNS.
+
+    :param pltx_roms: Rows of the roms table with the columns in _tu_ROM_COLUMNS.
+
+    :return: A _RomSet object.
+    """
+
+    u_name, u_desc, i_year, u_auth = ptx_romset[:4]
+
+    # Compound hashes are stored in the database, so they are restored as the cache of the romset.
+    tx_cache = tuple([str(x_value) if isinstance(x_value, unicode) else x_value for x_value in ptx_romset[4:]])
+
+    ltx_roms = [(u_rom_name, i_size, roms._hex_to_hash(u_crc32), roms._hex_to_hash(u_md5), roms._hex_to_hash(u_sha1))
+                for u_rom_name, i_size, u_crc32, u_md5, u_sha1 in pltx_roms]
+
+    return roms._romset_unserialize((u_name, u_desc, i_year, u_auth, ltx_roms, tx_cache))